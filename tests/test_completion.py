@@ -0,0 +1,65 @@
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+import pytest
+import typer
+
+from tunnel_completion import CLI_COMMANDS, RUN_VALUE_OPTIONS
+from tunnel_runner import cli
+
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'run_tunnel.py'
+CONFIG = '''
+[ssh_hosts.miniserver]
+description = "Home box"
+
+[ssh_hosts.bastion]
+
+[targets.postgres]
+local_port = 15432
+remote_port = 5432
+'''
+TYPER_PATH = f'import sys; sys.argv = [{SCRIPT.name!r}]; import tunnel_runner; ' \
+             f'tunnel_runner.cli(prog_name={SCRIPT.name!r})'
+
+
+def test_cli_commands_are_the_typer_ones():
+    group = typer.main.get_command(cli)
+    with typer.Context(group) as ctx:
+        commands = [(name, group.get_command(ctx, name).get_short_help_str()) for name in group.list_commands(ctx)]
+    assert list(CLI_COMMANDS.items()) == commands
+
+
+def test_run_value_options_are_the_typer_ones():
+    run = typer.main.get_command(cli).commands['run']
+    value_options = {opt for param in run.params if param.param_type_name == 'option' and not param.is_flag
+                     for opt in param.opts + param.secondary_opts}
+    assert RUN_VALUE_OPTIONS == value_options
+
+
+def complete(tmp_path, shell: str, line: str, fast: bool) -> str:
+    """Complete a command line with the fast path of the script or with typer, which the import skips."""
+
+    (tmp_path / '.config').mkdir(exist_ok=True)
+    (tmp_path / '.config' / 'tunnel-runner.toml').write_text(CONFIG)
+    env = dict(os.environ, XDG_CONFIG_HOME=str(tmp_path), XDG_CACHE_HOME=str(tmp_path),
+               _TYPER_COMPLETE_FISH_ACTION='get-args')
+    env[f'_{SCRIPT.name}_COMPLETE'.replace('-', '_').upper()] = f'complete_{shell}'
+    words = f'{SCRIPT.name} {line}'
+    if shell == 'bash':
+        env.update(COMP_WORDS=words, COMP_CWORD=str(len(words.split()) - (not words.endswith(' '))))
+    else:
+        env['_TYPER_COMPLETE_ARGS'] = words
+    command = [sys.executable, str(SCRIPT)] if fast else [sys.executable, '-c', TYPER_PATH]
+    process = subprocess.run(command, env=env, cwd=SCRIPT.parent, capture_output=True, text=True, check=True)
+    return process.stdout
+
+
+@pytest.mark.parametrize('shell', ['bash', 'zsh', 'fish'])
+@pytest.mark.parametrize('line', ['', 'b', 'run ', 'run miniserver '])
+def test_fast_path_answers_as_typer(tmp_path, shell, line):
+    fast = complete(tmp_path, shell, line, fast=True)
+    assert fast.strip()
+    assert fast == complete(tmp_path, shell, line, fast=False)
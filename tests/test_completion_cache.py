@@ -0,0 +1,100 @@
+import os
+import json
+import multiprocessing
+from functools import partial
+
+import tunnel_runner
+from tunnel_completion import CompletionCache, read_config_sections
+from tunnel_runner import load_config_sections
+
+
+CONFIG = '''
+[SSH_HOSTS.MiniServer]
+description = "Home box"
+
+[SSH_HOSTS.other]
+
+[targets.Postgres]
+description = 'pg "main": the one'
+local_port = 15432
+remote_port = 5432
+
+[targets.redis]
+remote_port = 6379
+'''
+SECTIONS = {'ssh_hosts': {'MiniServer': 'Home box', 'other': ''},
+            'targets': {'Postgres': 'pg "main": the one', 'redis': ''}}
+
+
+def write_config(path, text=CONFIG):
+    path.write_text(text)
+    return path
+
+
+def test_an_unchanged_config_hits(tmp_path):
+    config = write_config(tmp_path / 'tunnel-runner.toml')
+    cache = CompletionCache(tmp_path / 'cache.json')
+    assert cache.get(config) is None
+    cache.put(config, SECTIONS)
+    assert CompletionCache(tmp_path / 'cache.json').get(config) == SECTIONS
+
+
+def test_a_size_change_invalidates(tmp_path):
+    config = write_config(tmp_path / 'tunnel-runner.toml')
+    cache = CompletionCache(tmp_path / 'cache.json')
+    cache.put(config, SECTIONS)
+    stat = config.stat()
+    write_config(config, CONFIG + '\n[targets.mysql]\n')
+    os.utime(config, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # The same mtime
+    assert cache.get(config) is None
+
+
+def test_an_mtime_change_invalidates(tmp_path):
+    config = write_config(tmp_path / 'tunnel-runner.toml')
+    cache = CompletionCache(tmp_path / 'cache.json')
+    cache.put(config, SECTIONS)
+    write_config(config, CONFIG.replace('Home box', 'Work box'))  # The same size
+    os.utime(config, ns=(config.stat().st_atime_ns, config.stat().st_mtime_ns + 1))
+    assert cache.get(config) is None
+
+
+def test_a_broken_cache_file_is_rebuilt(tmp_path):
+    config = write_config(tmp_path / 'tunnel-runner.toml')
+    (tmp_path / 'cache.json').write_text('{"truncated')
+    cache = CompletionCache(tmp_path / 'cache.json')
+    assert cache.get(config) is None
+    cache.put(config, SECTIONS)
+    assert cache.get(config) == SECTIONS
+
+
+def put_repeatedly(cache_file, config_file, rounds=50):
+    cache = CompletionCache(cache_file)
+    for _ in range(rounds):
+        cache.put(config_file, {'ssh_hosts': {config_file.name: ''}, 'targets': {}})
+
+
+def test_concurrent_writers_leave_a_valid_cache(tmp_path):
+    cache_file = tmp_path / 'cache.json'
+    configs = [write_config(tmp_path / f'{number}.toml') for number in range(4)]
+    context = multiprocessing.get_context('fork')
+    writers = [context.Process(target=put_repeatedly, args=(cache_file, config)) for config in configs]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        if cache_file.exists():
+            json.loads(cache_file.read_text())  # Never a partial write
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+
+    cache = CompletionCache(cache_file)
+    for config in configs:
+        assert cache.get(config) in (None, {'ssh_hosts': {config.name: ''}, 'targets': {}})  # Lost, never mixed up
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith('cache.json.')] == []
+
+
+def test_tomllib_and_dynaconf_build_the_same_tables(tmp_path, monkeypatch):
+    config = write_config(tmp_path / 'tunnel-runner.toml')
+    monkeypatch.setattr(tunnel_runner, 'CompletionCache', partial(CompletionCache, tmp_path / 'cache.json'))
+    assert read_config_sections(config) == SECTIONS
+    assert load_config_sections(config) == SECTIONS  # Built by Dynaconf on a cache miss
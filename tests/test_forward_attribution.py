@@ -0,0 +1,42 @@
+from tunnel_runner import TUIHeaderInfo, ForwardAttribution
+
+
+def attribution() -> ForwardAttribution:
+    """Two units where the remote port of the first is the local port of the second."""
+    info = TUIHeaderInfo(local_unit='127.0.0.1:5432', local_name='postgres',
+                         remote_unit='127.0.0.1:5433', remote_name='miniserver.local',
+                         forwards=[TUIHeaderInfo(local_unit='127.0.0.1:15432', local_name='replica',
+                                                 remote_unit='127.0.0.1:5432', remote_name='miniserver.local'),
+                                   TUIHeaderInfo(local_unit='/tmp/redis.sock', local_name='redis',
+                                                 remote_unit='/run/redis.sock', remote_name='miniserver.local')])
+    return ForwardAttribution(info)
+
+
+def test_the_local_side_phrasings_are_attributed():
+    tag = attribution()
+    assert tag('debug1: Local connections to LOCALHOST:15432 forwarded to remote address 127.0.0.1:5432') \
+        .startswith('[replica] ')
+    assert tag('debug1: Local forwarding listening on 127.0.0.1 port 5432.').startswith('[postgres] ')
+    assert tag('debug1: Local forwarding listening on path /tmp/redis.sock.').startswith('[redis] ')
+    assert tag('debug1: Local connections to /tmp/redis.sock:-2 forwarded to remote address /run/redis.sock:-2') \
+        .startswith('[redis] ')
+
+
+def test_a_remote_port_is_not_a_local_one():
+    tag = attribution()
+    line = 'debug1: Connection to port 15432 forwarding to 127.0.0.1 port 5432 requested.'
+    assert tag(line) == f'[replica] {line}'
+    assert tag('debug1: channel 3: new [direct-tcpip]') == '[replica] debug1: channel 3: new [direct-tcpip]'
+    assert tag('debug1: channel 3: free: direct-tcpip: listening port 15432 for 127.0.0.1 port 5432, '
+               'connect from 127.0.0.1 port 5432 to 127.0.0.1 port 15432, nchannels 4').startswith('[replica] ')
+
+
+def test_a_client_port_is_not_a_local_one():
+    tag = attribution()
+    line = 'debug1: channel 4: free: direct-tcpip: listening port 5432 for 127.0.0.1 port 5433, ' \
+           'connect from 127.0.0.1 port 15432 to 127.0.0.1 port 5432, nchannels 3'
+    assert tag(line) == f'[postgres] {line}'
+    line = 'debug1: Connection to port 5432 forwarding to 127.0.0.1 port 5433 requested.'
+    assert tag(line) == f'[postgres] {line}'
+    assert tag('debug1: client_input_global_request: rtype keepalive@openssh.com port 15432 want_reply 1') \
+        == 'debug1: client_input_global_request: rtype keepalive@openssh.com port 15432 want_reply 1'
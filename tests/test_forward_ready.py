@@ -0,0 +1,34 @@
+import asyncio
+import socket
+
+from tunnel_runner import TUIHeaderInfo, OutputQueue, unit_is_listening, watch_forward_ready
+
+
+def test_tcp_unit_is_listening_without_binding_it():
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        port = server.getsockname()[1]
+        assert unit_is_listening(f'127.0.0.1:{port}', 0)
+        assert unit_is_listening(f'localhost:{port}', 0)
+        assert not unit_is_listening(f'127.0.0.2:{port}', 0)
+    assert not unit_is_listening(f'127.0.0.1:{port}', 0)
+
+
+def test_unix_unit_is_listening_since(tmp_path):
+    path = tmp_path / 'forward.sock'
+    with socket.socket(socket.AF_UNIX) as server:
+        server.bind(str(path))
+        server.listen()
+        assert unit_is_listening(str(path), 0)
+        assert not unit_is_listening(str(path), path.stat().st_ctime + 10)  # A stale one
+
+
+def test_watch_forward_ready_reports_the_time_to_forward():
+    output, ready = OutputQueue(), []
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        info = TUIHeaderInfo(local_unit=f'127.0.0.1:{server.getsockname()[1]}', local_name='postgres',
+                             remote_unit='127.0.0.1:5432', remote_name='miniserver.local')
+        asyncio.run(watch_forward_ready(info, output, 'warm', on_ready=ready.append))
+
+    [(style, line)] = output.drain()
+    assert line.startswith('Forwarded in ') and line.endswith('s, warm start')
+    assert len(ready) == 1
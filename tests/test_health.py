@@ -0,0 +1,141 @@
+import os
+import sys
+import asyncio
+import socket
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from tunnel_runner import TUIHeaderInfo, HealthProbe, ProbeResult, Watchdog, ssh_socket_stalled
+
+
+async def probe(unit: str) -> tuple:
+    info = TUIHeaderInfo(local_unit=unit, local_name='service', remote_unit='127.0.0.1:80', remote_name='host')
+    return await HealthProbe(info, asyncio.get_running_loop(), timeout=0.2).probe(unit)
+
+
+def probe_server(on_connection) -> tuple:
+    """Probe a local server handling a connection with a coroutine taking the writer."""
+
+    async def run():
+        server = await asyncio.start_server(lambda reader, writer: on_connection(writer), '127.0.0.1', 0)
+        async with server:
+            return await probe(f'127.0.0.1:{server.sockets[0].getsockname()[1]}')
+
+    return asyncio.run(run())
+
+
+def test_a_greeting_is_timed():
+    async def greet(writer):
+        writer.write(b'220 ready\r\n')
+
+    result, rtt = probe_server(greet)
+    assert result == ProbeResult.answered and rtt is not None
+
+
+def test_silence_is_reachable_without_an_rtt():
+    async def wait(writer):
+        await asyncio.sleep(1)
+
+    assert probe_server(wait) == (ProbeResult.reachable, None)
+
+
+def test_an_eof_is_closed():
+    async def close(writer):
+        writer.close()
+
+    assert probe_server(close) == (ProbeResult.closed, None)
+
+
+def test_no_listener_is_unreachable():
+    with socket.socket() as free:
+        free.bind(('127.0.0.1', 0))
+        unit = f'127.0.0.1:{free.getsockname()[1]}'
+    assert asyncio.run(probe(unit)) == (ProbeResult.unreachable, None)
+
+
+@pytest.fixture
+def watchdog():
+    """A watchdog of a deadline 0 over a supervisor recording its failures. No TCP connections in /proc."""
+    info = TUIHeaderInfo(local_unit='127.0.0.1:15432', local_name='postgres',
+                         remote_unit='127.0.0.1:5432', remote_name='miniserver.local')
+    supervisor = SimpleNamespace(line_observers=[], down_since=None, failures=[], info=info,
+                                 ssh=SimpleNamespace(process=SimpleNamespace(pid=os.getpid())))
+    supervisor.fail = supervisor.failures.append
+    event_loop = asyncio.new_event_loop()
+    yield Watchdog(supervisor, event_loop, deadline=0)
+    event_loop.close()
+
+
+def check_twice(watchdog: Watchdog) -> list:
+    """A suspicion starts on the first check and becomes a stall on the second one."""
+    watchdog._check()
+    watchdog._check()
+    watchdog.stop()
+    return watchdog.supervisor.failures
+
+
+def test_an_unreachable_unit_is_a_stall(watchdog):
+    watchdog.observe_probe([ProbeResult.answered, ProbeResult.unreachable])
+    assert check_twice(watchdog) == ['Stalled for 0s: probe unreachable']
+
+
+@pytest.mark.parametrize('results', [[ProbeResult.closed], [ProbeResult.reachable], [ProbeResult.answered]])
+def test_a_reached_unit_is_no_stall(watchdog, results):
+    watchdog.observe_probe(results)
+    assert check_twice(watchdog) == []
+
+
+def test_a_refused_channel_is_a_sign_of_life(watchdog):
+    watchdog.suspected_since = 0
+    watchdog.observe_line('debug1: channel 3: open failed: connect failed: Connection refused')
+    assert watchdog.suspected_since is None
+
+
+FAKE_SSH = '''
+import sys, socket
+session = socket.create_connection(('127.0.0.1', int(sys.argv[1])))
+forward = socket.create_server(('127.0.0.1', 0))
+print(forward.getsockname()[1], flush=True)
+accepted, _ = forward.accept()
+sys.stdin.readline()
+accepted.shutdown(socket.SHUT_WR)  # The remote service closed the forwarded connection
+print('closed', flush=True)
+sys.stdin.readline()
+'''
+
+
+@pytest.fixture
+def fake_ssh():
+    """A process with a session to a server and a forward that accepted a local client."""
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        process = subprocess.Popen([sys.executable, '-c', FAKE_SSH, str(server.getsockname()[1])],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        session, _ = server.accept()
+        forward_port = int(process.stdout.readline())
+        client = socket.create_connection(('127.0.0.1', forward_port))
+        try:
+            yield process, session, forward_port
+        finally:
+            process.kill()
+            process.wait()
+            client.close()
+            session.close()
+
+
+def test_a_half_closed_forward_connection_is_no_stall(fake_ssh):
+    process, session, forward_port = fake_ssh
+    assert ssh_socket_stalled(process.pid) is False
+    process.stdin.write('close\n')
+    process.stdin.flush()
+    assert process.stdout.readline() == 'closed\n'
+
+    assert ssh_socket_stalled(process.pid) is False
+    assert ssh_socket_stalled(process.pid, frozenset({forward_port})) is False
+
+
+def test_a_closed_session_is_a_stall(fake_ssh):
+    process, session, forward_port = fake_ssh
+    session.shutdown(socket.SHUT_WR)
+    assert ssh_socket_stalled(process.pid, frozenset({forward_port})) is True
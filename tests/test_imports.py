@@ -0,0 +1,17 @@
+import pytest
+
+from tunnel_runner import IMPORT_CONFIG, IMPORT_BUDGETS, measure_imports
+
+
+@pytest.mark.parametrize('path, args, completion, forbidden', IMPORT_BUDGETS,
+                         ids=[budget[0] for budget in IMPORT_BUDGETS])
+def test_startup_path_skips_the_forbidden_imports(tmp_path, path, args, completion, forbidden):
+    config = tmp_path / 'tunnel-runner.toml'
+    config.write_text(IMPORT_CONFIG)
+    args = [arg.format(config=config, tmp=tmp_path) for arg in args]
+    completion = completion.format(config=config) if completion is not None else None
+
+    _, packages, code = measure_imports(args, completion, str(tmp_path))
+    assert code == 0
+    assert 'shlex' in packages  # The script itself ran
+    assert forbidden & packages == set()
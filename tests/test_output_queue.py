@@ -0,0 +1,62 @@
+import os
+
+from tunnel_runner import OutputQueue, Overflow
+
+
+def put_lines(output: OutputQueue, count: int):
+    for number in range(count):
+        output.put('out', f'line {number}')
+
+
+def texts(lines: list) -> list:
+    return [line for _, line in lines]
+
+
+def test_drop_oldest_keeps_the_newest_lines():
+    output = OutputQueue(max_lines=3, overflow=Overflow.drop_oldest)
+    put_lines(output, 5)
+
+    lines = output.drain()
+    assert lines[0] == ('err', '... 2 lines dropped (drop-oldest), the TUI falls behind')
+    assert texts(lines[1:]) == ['line 2', 'line 3', 'line 4']
+    assert output.dropped_total == 2
+    assert output.drain() == []
+
+
+def test_sample_keeps_every_nth_new_line():
+    output = OutputQueue(max_lines=3, overflow=Overflow.sample, sample_every=2)
+    put_lines(output, 7)
+
+    lines = output.drain()
+    assert lines[0] == ('err', '... 4 lines dropped (sample), the TUI falls behind')
+    assert texts(lines[1:]) == ['line 2', 'line 3', 'line 5']
+
+
+def test_summarize_keeps_the_oldest_lines_and_reports_last():
+    output = OutputQueue(max_lines=3, overflow=Overflow.summarize)
+    put_lines(output, 5)
+
+    lines = output.drain()
+    assert texts(lines[:3]) == ['line 0', 'line 1', 'line 2']
+    assert lines[3] == ('err', '... 2 lines dropped (summarize), the TUI falls behind')
+
+    put_lines(output, 1)  # The counter starts over after a drain
+    assert output.drain() == [('out', 'line 0')]
+    assert output.dropped_total == 2
+
+
+def test_wakes_up_only_when_it_becomes_non_empty():
+    read_end, write_end = os.pipe()
+    try:
+        output = OutputQueue(max_lines=2)
+        output.wakeup_fd = write_end
+        os.set_blocking(read_end, False)
+
+        put_lines(output, 5)
+        assert os.read(read_end, 16) == b'\0'
+        output.drain()
+        put_lines(output, 1)
+        assert os.read(read_end, 16) == b'\0'
+    finally:
+        os.close(read_end)
+        os.close(write_end)
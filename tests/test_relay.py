@@ -0,0 +1,100 @@
+import os
+import struct
+import socket
+import asyncio
+
+import pytest
+
+from tunnel_runner import RelayEngine, relay_sockets
+
+
+ENGINES = [RelayEngine.copy,
+           pytest.param(RelayEngine.splice, marks=pytest.mark.skipif(not hasattr(os, 'splice'), reason='Linux only'))]
+
+
+def tcp_pair() -> tuple:
+    """The two ends of a loopback TCP connection."""
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        near = socket.create_connection(server.getsockname())
+        far, _ = server.accept()
+    near.setblocking(False)
+    far.setblocking(False)
+    return near, far
+
+
+async def read_all(sock: socket.socket) -> bytes:
+    data = bytearray()
+    while chunk := await asyncio.get_running_loop().sock_recv(sock, 64 * 1024):
+        data += chunk
+    return bytes(data)
+
+
+async def send_all(sock: socket.socket, data: bytes):
+    await asyncio.get_running_loop().sock_sendall(sock, data)
+    sock.shutdown(socket.SHUT_WR)
+
+
+def relay(engine: RelayEngine, exchange) -> tuple:
+    """Run a coroutine exchanging data between a local client and a service through a relay.
+    Its result and the bytes counted up and down.
+    """
+
+    async def run():
+        app, client = tcp_pair()
+        upstream, service = tcp_pair()
+        up, down = [], []
+        try:
+            relaying = asyncio.ensure_future(relay_sockets(asyncio.get_running_loop(), client, upstream, engine,
+                                                           up.append, down.append))
+            result = await asyncio.wait_for(exchange(app, service), 10)
+            await asyncio.wait_for(relaying, 5)
+        finally:
+            for sock in (app, client, upstream, service):
+                sock.close()
+        return result, sum(up), sum(down)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_both_directions_arrive_intact(engine):
+    request, response = os.urandom(3 * 1024 * 1024 + 7), os.urandom(5 * 1024 * 1024 + 11)
+
+    async def exchange(app, service):
+        _, _, received, answered = await asyncio.gather(send_all(app, request), send_all(service, response),
+                                                        read_all(service), read_all(app))
+        return received, answered
+
+    (received, answered), up, down = relay(engine, exchange)
+    assert received == request and answered == response
+    assert (up, down) == (len(request), len(response))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_a_half_close_is_passed_on(engine):
+    async def exchange(app, service):
+        await send_all(app, b'request')
+        received = await read_all(service)  # The EOF came through
+        await send_all(service, b'response to ' + received)  # The other direction still works
+        return await read_all(app)
+
+    answered, up, down = relay(engine, exchange)
+    assert answered == b'response to request'
+    assert (up, down) == (len(b'request'), len(b'response to request'))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_a_peer_reset_ends_both_directions(engine):
+    async def exchange(app, service):
+        await asyncio.get_running_loop().sock_sendall(app, b'request')
+        assert await asyncio.get_running_loop().sock_recv(service, 64) == b'request'
+        service.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        service.close()  # A reset
+        try:
+            return await read_all(app)
+        except ConnectionResetError:
+            return b''
+
+    answered, up, down = relay(engine, exchange)
+    assert answered == b''
+    assert (up, down) == (len(b'request'), 0)
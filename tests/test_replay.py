@@ -0,0 +1,71 @@
+import gc
+import json
+import warnings
+
+import tunnel_runner
+from tunnel_runner import TUIHeaderInfo, SessionRecorder, Overflow, read_recording, replay, import_urwid
+
+
+LINES = [('err', 'debug1: Local forwarding listening on 127.0.0.1 port 15432.'),
+         ('out', 'Forwarded in 0.215s, cold start'),
+         ('out', 'Replayed 2 lines in 0.001s')]  # A replay of a replay, recorded
+
+
+def record(path) -> TUIHeaderInfo:
+    info = TUIHeaderInfo(local_unit='127.0.0.1:15432', local_name='postgres',
+                         remote_unit='127.0.0.1:5432', remote_name='miniserver.local')
+    recorder = SessionRecorder(path, info)
+    for style, line in LINES:
+        recorder.record(style, line)
+    recorder.close()
+    return info
+
+
+def test_read_recording_closes_the_file(tmp_path):
+    path = tmp_path / 'session.jsonl'
+    info = record(path)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        read_info, records = read_recording(path)
+        assert read_info == info
+        assert [(style, line) for _, style, line in records] == LINES
+
+        _, records = read_recording(path)
+        next(records)
+        records.close()  # A replay quit early
+        del records
+        gc.collect()
+    assert [warning.message for warning in caught if warning.category is ResourceWarning] == []
+
+
+def test_headless_replay_quits_after_its_own_last_line(tmp_path, capsys, monkeypatch):
+    path = tmp_path / 'session.jsonl'
+    record(path)
+    import_urwid()
+    walkers = []
+
+    class ScrollbackWalker(tunnel_runner.ScrollbackWalker):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            walkers.append(self)
+
+    monkeypatch.setattr(tunnel_runner, 'ScrollbackWalker', ScrollbackWalker)
+    replay(path, speed=0, scrollback_lines=0, scrollback_bytes=0, fps=30, output_queue=100,
+           overflow=Overflow.drop_oldest, headless=True, cols=100, rows=40)
+
+    [walker] = walkers
+    assert walker[walker.last_position].text.startswith('Replayed 3 lines in ')
+    report = json.loads(capsys.readouterr().out)
+    assert report['lines'] == len(LINES) + 1  # And the own last line
+    assert report['lines_dropped'] == 0
+
+
+def test_headless_replay_quits_when_its_last_line_is_dropped(tmp_path, capsys):
+    path = tmp_path / 'session.jsonl'
+    record(path)
+    replay(path, speed=0, scrollback_lines=0, scrollback_bytes=0, fps=30, output_queue=2,
+           overflow=Overflow.summarize, headless=True, cols=100, rows=40)
+
+    report = json.loads(capsys.readouterr().out)
+    assert (report['lines'], report['lines_dropped']) == (2, 2)
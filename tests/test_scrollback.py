@@ -0,0 +1,47 @@
+import tunnel_runner
+from tunnel_runner import TUIHeaderInfo, OutputQueue, create_tui_loop, import_urwid
+
+INFO = TUIHeaderInfo(local_unit='127.0.0.1:15432', local_name='postgres',
+                     remote_unit='127.0.0.1:5432', remote_name='miniserver.local')
+
+
+def test_tui_keeps_an_empty_bounded_walker(tmp_path):
+    """An empty walker is falsy, it mustn't be replaced by an unbounded one."""
+
+    import_urwid()
+    spill_file = tmp_path / 'spill.log'
+    walker = tunnel_runner.ScrollbackWalker(max_lines=2, spill_file=spill_file)
+    loop = create_tui_loop(INFO, OutputQueue(), walker, screen=tunnel_runner.HeadlessScreen())
+    assert loop.widget.body.body is walker
+
+    for number in range(5):
+        walker.add('out', f'line {number}')
+    assert [walker[position].text for position in walker.positions()] == ['line 3', 'line 4']
+    assert spill_file.read_text() == 'line 0\nline 1\nline 2\n'
+
+
+def test_byte_budget_evicts_across_a_compaction(tmp_path):
+    """Positions stay absolute and the budget holds after the arrays are compacted."""
+
+    import_urwid()
+    spill_file = tmp_path / 'spill.log'
+    walker = tunnel_runner.ScrollbackWalker(max_bytes=10, spill_file=spill_file)
+    for number in range(10):
+        walker.add('err' if number % 2 else 'out', f'line{number}')
+        assert walker.size <= 10
+
+    assert len(walker.starts) < 10 and len(walker.buffer) < 50  # Compacted on the way
+    assert list(walker.positions()) == [8, 9]
+    assert [walker[position].text for position in walker.positions()] == ['line8', 'line9']
+    assert [walker._line(walker.head + index)[0] for index in range(len(walker))] == ['out', 'err']
+    assert walker.focus == 8
+    assert spill_file.read_text() == ''.join(f'line{number}\n' for number in range(8))
+
+
+def test_byte_budget_keeps_the_newest_line_over_it():
+    import_urwid()
+    walker = tunnel_runner.ScrollbackWalker(max_bytes=4)
+    walker.add('out', 'short')
+    walker.add('out', 'a line over the budget')
+    assert [walker[position].text for position in walker.positions()] == ['a line over the budget']
+    assert walker.first == 1
@@ -0,0 +1,50 @@
+import os
+import asyncio
+import socket
+
+import pytest
+
+from tunnel_runner import TUIHeaderInfo, OutputQueue, Supervisor
+
+
+@pytest.fixture
+def fake_ssh(tmp_path, monkeypatch):
+    """An ssh on PATH that just keeps running."""
+    ssh = tmp_path / 'ssh'
+    ssh.write_text('#!/bin/sh\nexec sleep 60\n')
+    ssh.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{tmp_path}{os.pathsep}{os.environ["PATH"]}')
+
+
+def test_restarts_keep_one_readiness_watcher(fake_ssh):
+    with socket.socket() as free:
+        free.bind(('127.0.0.1', 0))
+        port = free.getsockname()[1]
+    info = TUIHeaderInfo(local_unit=f'127.0.0.1:{port}', local_name='postgres',
+                         remote_unit='127.0.0.1:5432', remote_name='miniserver.local')
+    output = OutputQueue()
+    event_loop = asyncio.new_event_loop()
+    supervisor = Supervisor([], info, output, event_loop, backoff=0.01, backoff_max=0.01)
+
+    async def fail_then_listen():
+        supervisor.start()
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            supervisor.fail('ssh is down')
+        await asyncio.sleep(0.1)  # Restarted
+        with socket.create_server(('127.0.0.1', port)):
+            await asyncio.sleep(0.3)
+
+    try:
+        event_loop.run_until_complete(fail_then_listen())
+        stable_handle = supervisor.stable_handle
+        supervisor.stop()
+    finally:
+        event_loop.close()
+
+    lines = [line for _, line in output.drain()]
+    assert sum(line.startswith('Forwarded in ') for line in lines) == 1
+    assert sum(line.startswith('Recovered in ') for line in lines) == 1
+    assert supervisor.reconnects == 3
+    assert stable_handle.cancelled() and supervisor.stable_handle is None
+    assert supervisor.failures == 3  # No stray backoff reset
@@ -0,0 +1,186 @@
+"""The shell completion fast path of tunnel-runner: the first word and the `run` arguments answered
+from the config or its cache with the stdlib only, before typer and dynaconf are imported.
+
+`run_tunnel.py` imports it first, so a TAB press costs a cached .pyc of this module
+instead of compiling the whole CLI.
+"""
+
+import os
+import re
+import sys
+import json
+import shlex
+from pathlib import Path
+from typing import Optional
+
+
+CONFIG_FILE = Path(os.getenv('XDG_CONFIG_HOME') or os.getenv('HOME')) / '.config' / 'tunnel-runner.toml'
+COMPLETION_CACHE = Path(os.getenv('XDG_CACHE_HOME') or Path(os.getenv('HOME')) / '.cache') \
+                   / 'tunnel-runner-completion.json'
+PROG_NAME = Path(sys.argv[0]).name
+COMPLETE_VAR = f'_{PROG_NAME}_COMPLETE'.replace('-', '_').upper()  # The same as click builds
+RUN_VALUE_OPTIONS = {'--verbose', '--local-address', '--local-port', '--remote-address', '--remote-port',
+                     '--local-sock', '--remote-sock', '--config',
+                     '--scrollback-lines', '--scrollback-bytes', '--spill-file', '--fps',
+                     '--output-queue', '--overflow', '--driver',
+                     '--control-persist', '--probe-interval', '--probe-timeout',
+                     '--stall-deadline', '--idle-timeout', '--metrics-file',
+                     '--relay-engine', '--pool', '--balance',
+                     '--record'}  # Options of `run` taking a value
+CLI_COMMANDS = {  # name: short help, in the order and the words typer completes them. `run` is the default one
+    'run': 'Establish an SSH forward tunnel.',
+    'multi': 'Establish several SSH forward tunnels in...',
+    'replay': 'Feed a recording of `run --record` to the...',
+    'bench': 'Load a running tunnel through the local...',
+    'completion': 'Shell completion scripts with the config...',
+    'forward': 'Add or cancel forwards on a live ssh...',
+    'benchmark': 'Offline benchmarks of tunnel-runner itself.',
+}
+SECTION_HOSTS = 'ssh_hosts'
+SECTION_TARGETS = 'targets'
+
+
+class CompletionCache:
+    """Name and help text tables of the config sections on disk.
+
+    An entry is keyed by the config path and is valid while the config size and mtime stay the same,
+    so an unchanged config is never parsed again on a TAB press.
+    """
+
+    def __init__(self, cache_file: Path = COMPLETION_CACHE):
+        self.cache_file = cache_file
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return {}  # No cache yet or a broken one, it's rebuilt
+
+    def get(self, config_file: Path) -> Optional[dict]:
+        stat = config_file.stat()
+        entry = self._load().get(str(config_file.resolve()))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sections']
+        return None
+
+    def put(self, config_file: Path, sections: dict):
+        stat = config_file.stat()
+        entries = self._load()
+        entries[str(config_file.resolve())] = {'size': stat.st_size,
+                                               'mtime_ns': stat.st_mtime_ns,
+                                               'sections': sections}
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_name(f'{self.cache_file.name}.{os.getpid()}')
+            tmp_file.write_text(json.dumps(entries))
+            tmp_file.replace(self.cache_file)  # Atomic for concurrent completions
+        except OSError:
+            pass  # A read-only home, the completion still works but uncached
+
+
+def read_config_sections(config_file: Path) -> Optional[dict]:
+    """Build name->description tables of the config sections with the stdlib only."""
+    try:
+        import tomllib  # On a cache miss only, it's the heaviest import of the fast path
+    except ImportError:  # Python < 3.11, the completion fast path answers from the cache only
+        return None
+
+    with config_file.open('rb') as file:
+        document = {key.lower(): value for key, value in tomllib.load(file).items()}  # As Dynaconf matches
+    return {section: {name: data.get('description', '') for name, data in document.get(section, {}).items()}
+            for section in (SECTION_HOSTS, SECTION_TARGETS)}
+
+
+def split_arg_string(string: str) -> list:
+    """Split a command line as click does, keeping an unclosed quoted word."""
+    lex = shlex.shlex(string, posix=True)
+    lex.whitespace_split = True
+    lex.commenters = ''
+    words = []
+    try:
+        for word in lex:
+            words.append(word)
+    except ValueError:
+        words.append(lex.token)
+    return words
+
+
+def complete_fast(instruction: str) -> bool:
+    """Answer a shell completion of the first word and the `run` command arguments before typer and dynaconf
+    are imported.
+
+    Mirrors the typer's completion protocol and output of bash, zsh and fish.
+    Returns False if the request has to be left to typer: an option, its value, another command's arguments,
+    an unknown shell or a config that can't be read without Dynaconf.
+    """
+
+    shell = instruction.partition('_')[2]
+    if shell == 'bash':
+        words = split_arg_string(os.getenv('COMP_WORDS', ''))
+        cword = int(os.getenv('COMP_CWORD', '0'))
+        args, incomplete = words[1:cword], words[cword] if cword < len(words) else ''
+    elif shell in {'zsh', 'fish'}:
+        completion_args = os.getenv('_TYPER_COMPLETE_ARGS', '')
+        args = split_arg_string(completion_args)[1:]
+        incomplete = args.pop() if args and not completion_args.endswith(' ') else ''
+    else:
+        return False
+
+    if incomplete.startswith('-') or args and args[0] in CLI_COMMANDS and args[0] != 'run':
+        return False  # Typer completes the options and the other commands
+    first_word = not args  # A command or the ssh_host of the default command: `run_tunnel.py HOST TARGET`
+    if args and args[0] == 'run':
+        args = args[1:]
+
+    config_file, positionals, words = CONFIG_FILE, [], iter(args)
+    for word in words:
+        option, _, value = word.partition('=')
+        if word in RUN_VALUE_OPTIONS:
+            value = next(words, None)
+            if value is None:
+                return False  # Completing an option value
+        elif not word.startswith('-'):
+            positionals.append(word)
+        if option == '--config':
+            config_file = Path(value)
+
+    if len(positionals) > 1:
+        return False
+    cfg_section = (SECTION_HOSTS, SECTION_TARGETS)[len(positionals)]
+
+    if not config_file.is_file():
+        records = {}
+    else:
+        cache = CompletionCache()
+        sections = cache.get(config_file)
+        if sections is None:
+            try:
+                sections = read_config_sections(config_file)
+            except (OSError, ValueError):
+                return False  # Let Dynaconf report or cope with it
+            if sections is None:
+                return False
+            cache.put(config_file, sections)
+        records = sections[cfg_section]
+
+    items = [(name, help) for name, help in records.items() if name.startswith(incomplete)]
+    if first_word:  # As `RunByDefault.shell_complete()`: the commands, then the ssh_hosts
+        items = [(name, help) for name, help in CLI_COMMANDS.items() if name.startswith(incomplete)] + items
+
+    if shell == 'bash':
+        output = '\n'.join(name for name, _ in items)
+    elif shell == 'zsh':
+        def escape(text):
+            return text.replace('"', '""').replace("'", "''").replace('$', '\\$') \
+                       .replace('`', '\\`').replace(':', r'\\:')
+
+        output = '\n'.join(f'"{escape(name)}":"{escape(help)}"' if help else f'"{escape(name)}"'
+                            for name, help in items)
+        output = f"_arguments '*: :(({output}))'" if items else '_files'
+    else:
+        if os.getenv('_TYPER_COMPLETE_FISH_ACTION') == 'is-args':
+            sys.exit(0 if items else 1)
+        output = '\n'.join(f'{name}\t' + re.sub(r'\s', ' ', help) if help else name for name, help in items)
+
+    print(output)
+    return True
@@ -0,0 +1,3047 @@
+# -*- coding: utf-8 -*-
+"""The CLI and the TUI of tunnel-runner, run by `run_tunnel.py` after its completion fast path."""
+from __future__ import annotations  # The urwid annotations aren't evaluated, so it's imported on a TUI path only
+
+import os
+import re
+import sys
+import json
+import stat
+import time
+import errno
+import shlex
+from enum import Enum
+from collections import OrderedDict, deque
+from pathlib import Path
+from dataclasses import dataclass, field, replace, asdict
+from typing import Optional, List, Callable
+
+from tunnel_completion import CONFIG_FILE, PROG_NAME, COMPLETE_VAR, RUN_VALUE_OPTIONS, CLI_COMMANDS, \
+    SECTION_HOSTS, SECTION_TARGETS, CompletionCache
+
+
+CMD_TEMPLATE = '-{verbose} -NL {local_unit}:{remote_unit} {ssh_host}'
+
+
+@dataclass
+class TUIHeaderInfo:
+    local_unit: str
+    local_name: str
+    remote_unit: str
+    remote_name: str
+    forwards: List['TUIHeaderInfo'] = field(default_factory=list)  # More units forwarded by the same ssh
+
+    @property
+    def units(self) -> List['TUIHeaderInfo']:
+        return [self, *self.forwards]
+
+
+class StartupTimings:
+    """The durations of the startup phases for `--timings`: each one lasts from the previous mark."""
+
+    LISTENING = re.compile(r'Local forwarding listening')
+
+    def __init__(self):
+        self.phases = []
+        self.last = time.perf_counter()
+        self.listening = False
+        age = self.process_age()
+        if age is not None:
+            self.phases.append(('python startup and stdlib imports', age))
+
+    @staticmethod
+    def process_age() -> Optional[float]:
+        """Seconds since the process start, in clock ticks of /proc, so Linux only."""
+        try:
+            with open('/proc/self/stat') as file:
+                start = int(file.read().rpartition(')')[2].split()[19]) / os.sysconf('SC_CLK_TCK')
+            with open('/proc/uptime') as file:
+                return float(file.read().split()[0]) - start
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def observe_line(self, line: str):
+        """Mark the first ssh output and the listening forward. Return True on the latter."""
+        if not any(phase == 'first ssh output' for phase, _ in self.phases):
+            self.mark('first ssh output')
+        if not self.listening and self.LISTENING.search(line):
+            self.listening = True
+            self.mark('forwarding listening')
+            return True
+        return False
+
+    def report(self) -> str:
+        total = sum(seconds for _, seconds in self.phases)
+        width = max(len(phase) for phase, _ in self.phases)
+        return '\n'.join([f'{phase:{width}} {seconds * 1000:8.1f} ms' for phase, seconds in self.phases]
+                         + [f'{"total":{width}} {total * 1000:8.1f} ms'])
+
+
+STARTUP_TIMINGS = StartupTimings()
+
+# The heavy dependencies are timed for `--timings`, asyncio is the heaviest of the stdlib
+import pty  # noqa: E402
+import fcntl  # noqa: E402
+import random  # noqa: E402
+import socket  # noqa: E402
+import asyncio  # noqa: E402
+import termios  # noqa: E402
+import resource  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+import subprocess  # noqa: E402
+import tracemalloc  # noqa: E402
+from array import array  # noqa: E402
+STARTUP_TIMINGS.mark('import asyncio and the rest of the stdlib')
+CONTROL_DIR = Path(os.getenv('XDG_RUNTIME_DIR') or tempfile.gettempdir()) / f'tunnel-runner-{os.getuid()}'
+from typer import Typer, Argument, Option, BadParameter, Exit  # noqa: E402
+from typer.core import TyperGroup  # noqa: E402
+STARTUP_TIMINGS.mark('import typer')
+from dynaconf import Dynaconf  # noqa: E402
+STARTUP_TIMINGS.mark('import dynaconf')
+urwid = None  # The heaviest one, imported by `import_urwid()` on a TUI path. sh is imported by `run_with_sh()`
+
+
+BASH_COMPLETION_SCRIPT = """\
+# Generated by `%(prog_name)s completion generate` from %(config)s
+# It's regenerated on the next TAB after the config changes.
+
+declare -ga %(func_name)s_hosts=(%(hosts)s)
+declare -ga %(func_name)s_targets=(%(targets)s)
+
+%(func_name)s() {
+    local cur="${COMP_WORDS[COMP_CWORD]}" args=() i
+    if [[ %(config)s -nt %(script)s ]]; then
+        %(regenerate)s >/dev/null 2>&1 && source %(script)s
+    fi
+
+    for ((i = 1; i < COMP_CWORD; i++)); do
+        case "${COMP_WORDS[i]}" in
+            %(value_options)s) ((i++)) ;;
+            -*) ;;
+            *) args+=("${COMP_WORDS[i]}") ;;
+        esac
+    done
+
+    # A first word that isn't a command is the ssh_host of the default `run`
+    case "${#args[@]}:${args[0]}" in
+        0:*) COMPREPLY=($(compgen -W "%(commands)s ${%(func_name)s_hosts[*]}" -- "$cur")) ;;
+%(subcommands)s
+        1:run) COMPREPLY=($(compgen -W "${%(func_name)s_hosts[*]}" -- "$cur")) ;;
+        2:run) COMPREPLY=($(compgen -W "${%(func_name)s_targets[*]}" -- "$cur")) ;;
+        %(other_commands)s) ;;  # Their arguments aren't config records
+        1:*) COMPREPLY=($(compgen -W "${%(func_name)s_targets[*]}" -- "$cur")) ;;
+    esac
+}
+
+complete -o default -F %(func_name)s %(prog_name)s
+"""
+
+ZSH_COMPLETION_SCRIPT = """\
+#compdef %(prog_name)s
+# Generated by `%(prog_name)s completion generate` from %(config)s
+# It's regenerated on the next TAB after the config changes.
+
+typeset -ga %(func_name)s_hosts=(%(hosts)s)
+typeset -ga %(func_name)s_targets=(%(targets)s)
+
+_%(prog_name)s() {
+    local -a commands=(%(commands)s)
+    local -a args
+    local i
+    if [[ %(config)s -nt %(script)s ]]; then
+        %(regenerate)s >/dev/null 2>&1 && source %(script)s
+    fi
+
+    for ((i = 2; i < CURRENT; i++)); do
+        case "${words[i]}" in
+            %(value_options)s) ((i++)) ;;
+            -*) ;;
+            *) args+=("${words[i]}") ;;
+        esac
+    done
+
+    # A first word that isn't a command is the ssh_host of the default `run`
+    case "${#args}:${args[1]}" in
+        0:*) _describe command commands; _describe ssh_host %(func_name)s_hosts ;;
+%(subcommands)s
+        1:run) _describe ssh_host %(func_name)s_hosts ;;
+        2:run) _describe target %(func_name)s_targets ;;
+        %(other_commands)s) ;;  # Their arguments aren't config records
+        1:*) _describe target %(func_name)s_targets ;;
+        *) _files ;;
+    esac
+}
+
+if [[ "$funcstack[1]" == "_%(prog_name)s" ]]; then
+    _%(prog_name)s "$@"
+else
+    compdef _%(prog_name)s %(prog_name)s
+fi
+"""
+
+FISH_COMPLETION_SCRIPT = """\
+# Generated by `%(prog_name)s completion generate` from %(config)s
+# It's regenerated on the next TAB after the config changes.
+
+set -g %(func_name)s_hosts %(hosts)s
+set -g %(func_name)s_targets %(targets)s
+
+function %(func_name)s
+    if test "$(path mtime -- %(config)s 2>/dev/null)" != %(config_mtime)s
+        %(regenerate)s >/dev/null 2>&1; and source %(script)s
+    end
+
+    set -l words (commandline -opc)
+    set -l args
+    set -l skip 0
+    for word in $words[2..-1]
+        if test $skip = 1
+            set skip 0
+            continue
+        end
+        switch $word
+            case %(value_options)s
+                set skip 1
+            case '-*'
+            case '*'
+                set -a args $word
+        end
+    end
+
+    # A first word that isn't a command is the ssh_host of the default `run`
+    switch "$(count $args):$args[1]"
+        case '0:*'
+            printf '%%s\\t%%s\\n' %(commands)s
+            printf '%%s\\n' $%(func_name)s_hosts
+%(subcommands)s
+        case 1:run
+            printf '%%s\\n' $%(func_name)s_hosts
+        case 2:run
+            printf '%%s\\n' $%(func_name)s_targets
+        case %(other_commands)s
+            # Their arguments aren't config records
+        case '1:*'
+            printf '%%s\\n' $%(func_name)s_targets
+    end
+end
+
+complete --command %(prog_name)s --no-files --arguments '(%(func_name)s)'
+"""
+
+COMPLETION_SCRIPTS = {
+    # shell: (template, default location)
+    'bash': (BASH_COMPLETION_SCRIPT,
+             Path(os.getenv('XDG_DATA_HOME') or Path(os.getenv('HOME')) / '.local' / 'share')
+             / 'bash-completion' / 'completions' / PROG_NAME),
+    'zsh': (ZSH_COMPLETION_SCRIPT, Path(os.getenv('HOME')) / '.zfunc' / f'_{PROG_NAME}'),
+    'fish': (FISH_COMPLETION_SCRIPT,
+             Path(os.getenv('XDG_CONFIG_HOME') or Path(os.getenv('HOME')) / '.config')
+             / 'fish' / 'completions' / f'{PROG_NAME}.fish'),
+}
+
+
+class RunByDefault(TyperGroup):
+    """Commands with `run` as the default one, so `run_tunnel.py HOST TARGET` starts a tunnel as ever."""
+
+    def parse_args(self, ctx, args: list) -> list:
+        options = {opt for param in self.get_params(ctx) for opt in param.opts}
+        if args and args[0] not in self.commands and args[0] not in options:
+            args = ['run', *args]
+        return super().parse_args(ctx, args)
+
+    def shell_complete(self, ctx, incomplete: str) -> list:
+        """The commands and the ssh_host names of the default `run`."""
+        completions = super().shell_complete(ctx, incomplete)
+        if not incomplete.startswith('-'):
+            ssh_host = next(param for param in self.commands['run'].params if param.name == 'ssh_host')
+            completions.extend(ssh_host.shell_complete(ctx, incomplete))
+        return completions
+
+
+cli = Typer(cls=RunByDefault, pretty_exceptions_enable=False)
+completion_cli = Typer(help='Shell completion scripts with the config records embedded. '
+                            'TAB costs no Python startup then.')
+cli.add_typer(completion_cli, name='completion')
+forward_cli = Typer(help='Add or cancel forwards on a live ssh ControlMaster of `--multiplex` tunnels.')
+cli.add_typer(forward_cli, name='forward')
+benchmark_cli = Typer(help='Offline benchmarks of tunnel-runner itself.')
+cli.add_typer(benchmark_cli, name='benchmark')
+
+
+class Autocompletion:
+    """Extract name and help text from the config."""
+
+    SECTION_HOSTS = SECTION_HOSTS
+    SECTION_TARGETS = SECTION_TARGETS
+
+    def __init__(self, cfg_section):
+        self.cfg_section = cfg_section
+            
+    def do(self, ctx, args, incomplete):
+        """Instead of the method __call_() as it raises
+        TypeError: <__main__.Autocompletion> is not a module, class, method, or function."""
+
+        config_option = Path(ctx.params.get('config') or CONFIG_FILE)
+        autocomplete_records = self._extract_config_records(self.cfg_section, config_option)
+
+        for record_name, help in autocomplete_records.items():
+            if record_name.startswith(incomplete):
+                yield (record_name, help)
+
+    def _extract_config_records(self, cfg_section, config_file: Path) -> dict:
+        """Return a name->description table of the section, from the cache if the config is unchanged."""
+        assert cfg_section in {self.SECTION_HOSTS, self.SECTION_TARGETS}, \
+               'Wrong `cfg_section` value of autocompletion.'
+
+        return load_config_sections(config_file)[cfg_section]
+
+
+def load_config_sections(config_file: Path) -> dict:
+    """Return name->description tables of all the sections, from the cache if the config is unchanged."""
+
+    if not config_file.exists():
+        # raise FileExistsError(config_file)
+        return {SECTION_HOSTS: {}, SECTION_TARGETS: {}}
+    elif not config_file.is_file():
+        # TypeError('Cofig must be a toml file')
+        return {SECTION_HOSTS: {}, SECTION_TARGETS: {}}
+
+    cache = CompletionCache()
+    sections = cache.get(config_file)
+    if sections is None:
+        settings = Dynaconf(settings_file=config_file)
+        sections = {section: {name: data.get('description', '')
+                              for name, data in settings.get(section, {}).items()}
+                    for section in (SECTION_HOSTS, SECTION_TARGETS)}
+        cache.put(config_file, sections)
+
+    return sections
+
+
+class Overflow(str, Enum):
+    drop_oldest = 'drop-oldest'
+    sample = 'sample'
+    summarize = 'summarize'
+
+
+class OutputQueue:
+    """Bounded hand-over of the ssh output lines from the reader threads to the TUI.
+
+    `put()` never blocks, so ssh never waits on a TUI falling behind. The loop is woken up
+    with a byte in a non-blocking pipe only when the queue becomes non-empty.
+    A full queue follows the overflow policy:
+    `drop-oldest` keeps the newest lines, `sample` keeps every `sample_every`-th new line
+    in place of the oldest one, `summarize` keeps the oldest lines. The dropped lines are
+    counted and reported with a line at the next drain.
+    A recorder gets every line put, the dropped ones too.
+    """
+
+    def __init__(self, max_lines: int = 10000, overflow: Overflow = Overflow.drop_oldest, sample_every: int = 10,
+                 recorder: Optional['SessionRecorder'] = None):
+        self.lines = deque()
+        self.recorder = recorder
+        self.max_lines = max_lines
+        self.overflow = overflow
+        self.sample_every = sample_every
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.dropped_total = 0
+        self._wakeup_fd = None
+
+    @property
+    def wakeup_fd(self) -> Optional[int]:
+        return self._wakeup_fd
+
+    @wakeup_fd.setter
+    def wakeup_fd(self, fd: int):
+        os.set_blocking(fd, False)
+        self._wakeup_fd = fd
+
+    def put(self, style: str, line: str):
+        with self.lock:
+            if self.recorder:
+                self.recorder.record(style, line)
+            was_empty = not self.lines
+            if len(self.lines) < self.max_lines:
+                self.lines.append((style, line))
+            elif self.overflow == Overflow.drop_oldest \
+                    or (self.overflow == Overflow.sample and self.dropped % self.sample_every == 0):
+                self.lines.popleft()
+                self.lines.append((style, line))
+                self.dropped += 1
+            else:
+                self.dropped += 1
+
+        if was_empty and self._wakeup_fd is not None:
+            try:
+                os.write(self._wakeup_fd, b'\0')
+            except BlockingIOError:
+                pass  # The pipe is full of wake-ups already
+
+    def drain(self) -> list:
+        with self.lock:
+            lines, self.lines = list(self.lines), deque()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self.dropped_total += dropped
+            summary = ('err', f'... {dropped} lines dropped ({self.overflow.value}), the TUI falls behind')
+            if self.overflow == Overflow.summarize:
+                lines.append(summary)
+            else:
+                lines.insert(0, summary)
+        return lines
+
+
+class SessionRecorder:
+    """The lines put to the TUI with their monotonic time offsets and styles, a JSON per line.
+
+    The first line is a header with the tunnel info, so a replay shows it the same.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path, info: TUIHeaderInfo):
+        self.file = path.open('w')
+        self.started = time.monotonic()
+        self.file.write(json.dumps({'version': self.VERSION, 'started': time.time(), 'info': asdict(info)}) + '\n')
+
+    def record(self, style: str, line: str):
+        self.file.write(json.dumps([round(time.monotonic() - self.started, 6), style, line]) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path: Path) -> tuple:
+    """The tunnel info and a generator of `(offset, style, line)` of a recording.
+    The generator has the file open until its end or its `close()`.
+    """
+
+    with path.open() as file:
+        header = json.loads(file.readline())
+        records_start = file.tell()
+    if header.get('version') != SessionRecorder.VERSION:
+        raise BadParameter(f'Not a recording of version {SessionRecorder.VERSION}', param_hint='recording')
+    info = header['info']
+    info = TUIHeaderInfo(**{**info, 'forwards': [TUIHeaderInfo(**forward) for forward in info['forwards']]})
+
+    def read_records():
+        with path.open() as file:
+            file.seek(records_start)
+            for record in file:
+                yield json.loads(record)
+
+    return info, read_records()
+
+
+class ScrollbackWalkerMixin:
+    """The tunnel output lines bounded by a line count and a byte budget, `ScrollbackWalker` of `import_urwid()`.
+
+    Lines are kept compact: utf-8 bytes in one buffer, their offsets and a style byte per line.
+    `urwid.Text` widgets are built only for the rows a ListBox asks for, i.e. the visible ones,
+    and the recent ones are kept in a small LRU.
+    Positions are absolute line numbers, so the eviction doesn't move the focus.
+    The oldest lines are evicted first and appended to a spill file if it's given,
+    so a long-running verbose tunnel keeps a flat memory footprint.
+    """
+
+    STYLES = ('out', 'err')
+    WIDGETS_CACHED = 256
+
+    def __init__(self, max_lines: int = 0, max_bytes: int = 0, spill_file: Optional[Path] = None):
+        self.max_lines = max_lines  # 0 is unlimited
+        self.max_bytes = max_bytes  # 0 is unlimited
+        self.spill = spill_file.open('a', buffering=1) if spill_file else None
+
+        self.buffer = bytearray()
+        self.starts = array('Q')  # Line offsets in the buffer
+        self.styles = bytearray()
+        self.head = 0  # Evicted lines at the arrays start waiting for a compaction
+        self.first = 0  # Absolute number of the oldest line
+        self.widgets = OrderedDict()
+        self.focus = 0
+
+    def __len__(self):
+        return len(self.starts) - self.head
+
+    @property
+    def size(self) -> int:
+        return len(self.buffer) - self.starts[self.head] if len(self) else 0
+
+    @property
+    def last_position(self) -> int:
+        return self.first + len(self) - 1
+
+    def _line(self, index: int) -> tuple:
+        """Style and text of a line by its index in the arrays."""
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.buffer)
+        return self.STYLES[self.styles[index]], self.buffer[self.starts[index]:end].decode()
+
+    def __getitem__(self, position: int) -> urwid.Text:
+        if not self.first <= position <= self.last_position:
+            raise IndexError(position)
+
+        widget = self.widgets.get(position)
+        if widget is None:
+            widget = self.widgets[position] = urwid.Text(self._line(position - self.first + self.head))
+            if len(self.widgets) > self.WIDGETS_CACHED:
+                self.widgets.popitem(last=False)
+        else:
+            self.widgets.move_to_end(position)
+        return widget
+
+    def next_position(self, position: int) -> int:
+        if position >= self.last_position:
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= self.first:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse: bool = False):
+        lines = range(self.first, self.last_position + 1)
+        return reversed(lines) if reverse else lines
+
+    def set_focus(self, position: int):
+        self.focus = position
+        self._modified()
+
+    def add(self, style: str, text: str):
+        self.starts.append(len(self.buffer))
+        self.styles.append(self.STYLES.index(style))
+        self.buffer += text.encode()
+
+        evicted = 0
+        while (self.max_lines and len(self) - evicted > self.max_lines) \
+                or (self.max_bytes and len(self) - evicted > 1
+                    and len(self.buffer) - self.starts[self.head + evicted] > self.max_bytes):
+            evicted += 1
+        if evicted:
+            self._evict(evicted)
+
+    def _evict(self, count: int):
+        if self.spill:
+            self.spill.writelines(f'{self._line(index)[1]}\n' for index in range(self.head, self.head + count))
+        for position in range(self.first, self.first + count):
+            self.widgets.pop(position, None)
+        self.head += count
+        self.first += count
+        self.focus = max(self.focus, self.first)
+
+        if self.head > len(self.starts) // 2:  # Amortized compaction of the arrays
+            offset = self.starts[self.head]
+            del self.buffer[:offset]
+            self.starts = array('Q', (start - offset for start in self.starts[self.head:]))
+            del self.styles[:self.head]
+            self.head = 0
+
+
+class Driver(str, Enum):
+    asyncio = 'asyncio'
+    sh = 'sh'
+
+
+class PtySsh:
+    """Ssh on a pty read by the asyncio loop, the one the TUI runs on. No helper threads.
+
+    Stdin and stdout share the pty as `_unify_ttys` of sh does, stderr is a pipe.
+    The exit is noticed with a pidfd where Linux has it, otherwise by polling.
+    """
+
+    PROMPT = b'Are you sure you want'
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, cmd_args: list, output: OutputQueue, event_loop: asyncio.AbstractEventLoop,
+                 on_exit: Optional[Callable[[int], None]] = None, tag_line: Optional[Callable[[str], str]] = None,
+                 on_line: Optional[Callable[[str], None]] = None, env: Optional[dict] = None):
+        self.cmd_args = cmd_args
+        self.output = output
+        self.event_loop = event_loop
+        self.on_exit = on_exit
+        self.tag_line = tag_line
+        self.on_line = on_line
+        self.env = env  # Of the ssh process, the current one if None
+        self.process = None
+        self.pty_fd = None
+        self.carry = {}
+
+    def start(self):
+        self.pty_fd, tty_fd = pty.openpty()
+        err_read, err_write = os.pipe()
+        self.process = subprocess.Popen(['ssh', *self.cmd_args], stdin=tty_fd, stdout=tty_fd, stderr=err_write,
+                                        env=self.env, start_new_session=True, preexec_fn=self._set_controlling_tty)
+        os.close(tty_fd)
+        os.close(err_write)
+
+        for fd, style in ((self.pty_fd, 'out'), (err_read, 'err')):
+            os.set_blocking(fd, False)
+            self.event_loop.add_reader(fd, self._read, fd, style)
+        try:
+            pidfd = os.pidfd_open(self.process.pid)
+        except (AttributeError, OSError):
+            self.event_loop.call_later(self.POLL_INTERVAL, self._poll)
+        else:
+            self.event_loop.add_reader(pidfd, self._reap, pidfd)
+
+    @staticmethod
+    def _set_controlling_tty():
+        fcntl.ioctl(0, termios.TIOCSCTTY, 0)  # For password and passphrase prompts
+
+    def _read(self, fd: int, style: str):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:  # EIO of the pty when ssh closed its side
+            data = b''
+
+        if not data:
+            self.event_loop.remove_reader(fd)
+            os.close(fd)
+            if fd == self.pty_fd:
+                self.pty_fd = None
+            rest = self.carry.pop(style, b'')
+            if rest:
+                self.output.put(style, rest.decode(errors='replace'))
+            return
+
+        lines = (self.carry.get(style, b'') + data).split(b'\n')
+        self.carry[style] = lines.pop()
+        if self.carry[style].startswith(self.PROMPT):  # A prompt waits without a newline
+            lines.append(self.carry.pop(style))
+
+        for line in lines:
+            text = line.decode(errors='replace')
+            self.output.put(style, self.tag_line(text) if self.tag_line else text)
+            if self.on_line:
+                self.on_line(text)
+            if line.startswith(self.PROMPT) and self.pty_fd is not None:
+                os.write(self.pty_fd, b'yes\n')
+
+    def _poll(self):
+        if self.process.poll() is None:
+            self.event_loop.call_later(self.POLL_INTERVAL, self._poll)
+        else:
+            self._exited()
+
+    def _reap(self, pidfd: int):
+        self.event_loop.remove_reader(pidfd)
+        os.close(pidfd)
+        self.process.wait()
+        self._exited()
+
+    def _exited(self):
+        if self.on_exit:  # Cleared for an intentional stop
+            self.output.put('err', f'ssh exited with the code {self.process.returncode}')
+            self.on_exit(self.process.returncode)
+
+    def terminate(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class ControlMaster:
+    """A ssh ControlMaster socket per ssh_host shared by the tunnels to it.
+
+    The first tunnel starts the master, the next ones attach to it and get forwarded in milliseconds,
+    without a connection, a key exchange and an authentication. `ControlPersist` keeps the master
+    after the last tunnel for the next run.
+    """
+
+    def __init__(self, ssh_host: str, persist: str = '10m'):
+        self.ssh_host = ssh_host
+        self.persist = persist
+        self.path = CONTROL_DIR / '%C'  # A hash of the connection, short enough for a unix socket
+
+    def options(self) -> list:
+        CONTROL_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        return ['-o', 'ControlMaster=auto', '-o', f'ControlPath={self.path}', '-o', f'ControlPersist={self.persist}']
+
+    def command(self, operation: str, *args) -> list:
+        return ['ssh', '-o', f'ControlPath={self.path}', '-O', operation, *args, self.ssh_host]
+
+    def is_alive(self) -> bool:
+        try:
+            return subprocess.run(self.command('check'), capture_output=True, timeout=5).returncode == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+    def control_forward(self, operation: str, unit: TUIHeaderInfo) -> str:
+        """Send a `forward` or `cancel` control message for a unit. Return the failure message if any."""
+        try:
+            result = subprocess.run(self.command(operation, '-L', f'{unit.local_unit}:{unit.remote_unit}'),
+                                    capture_output=True, text=True, timeout=5)
+        except subprocess.TimeoutExpired:
+            return 'The master does not answer'
+        return result.stderr.strip() or 'Failed' if result.returncode else ''
+
+    def cancel(self, info: TUIHeaderInfo):
+        for unit in info.units:
+            self.control_forward('cancel', unit)
+
+
+def unit_address(unit: str) -> Optional[tuple]:
+    """The `(address, port)` of a TCP unit, None for a unix socket."""
+
+    address, _, port = unit.rpartition(':')
+    if address and port.isdigit():
+        return address.strip('[]'), int(port)
+    return None
+
+
+def listening_tcp_addresses() -> Optional[set]:
+    """The `(address, port)` of the listening TCP sockets in /proc, None if there is no /proc."""
+
+    listening, tables = set(), 0
+    for table, family in (('tcp', socket.AF_INET), ('tcp6', socket.AF_INET6)):
+        try:
+            with open(f'/proc/net/{table}') as file:
+                next(file)  # A header
+                # sl local_address rem_address st ...
+                for fields in map(str.split, file):
+                    if fields[3] != '0A':  # Not a TCP_LISTEN one
+                        continue
+                    address, port = fields[1].split(':')
+                    packed = b''.join(int(address[start:start + 8], 16).to_bytes(4, sys.byteorder)  # Host order words
+                                      for start in range(0, len(address), 8))
+                    listening.add((socket.inet_ntop(family, packed), int(port, 16)))
+        except (OSError, StopIteration):
+            continue  # No IPv6
+        tables += 1
+    return listening if tables else None
+
+
+def unit_is_listening(unit: str, since: float) -> bool:
+    """Find out whether a local unit listens without connecting to it, so the remote side isn't touched.
+
+    A TCP unit is looked up in /proc. Binding its address instead would race with the bind of ssh,
+    so it's the way where there is no /proc only.
+    """
+
+    address = unit_address(unit)
+    if address:
+        listening = listening_tcp_addresses()
+        if listening is None:
+            with socket.socket(socket.AF_INET6 if ':' in address[0] else socket.AF_INET) as probe:
+                try:
+                    probe.bind(address)
+                except OSError as error:
+                    return error.errno == errno.EADDRINUSE
+                return False
+
+        host, port = address
+        try:
+            hosts = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+        except OSError:
+            hosts = None  # Any address of the port then
+        return any(listening_port == port and (hosts is None or listening_host in hosts | {'0.0.0.0', '::'})
+                   for listening_host, listening_port in listening)
+
+    try:
+        unit_stat = os.stat(unit)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(unit_stat.st_mode) and unit_stat.st_ctime >= since  # Not a stale one
+
+
+async def watch_forward_ready(info: TUIHeaderInfo, output: OutputQueue, start: str,
+                              interval: float = 0.1, timeout: float = 60,
+                              on_ready: Optional[Callable[[float], None]] = None):
+    """Report the time-to-forward: from now until all the local units listen.
+
+    It polls on the asyncio loop, not with urwid alarms: an alarm is a redraw of the TUI.
+    """
+
+    started, since = time.monotonic(), time.time() - 1  # ctime granularity
+    while True:
+        elapsed = time.monotonic() - started
+        if all(unit_is_listening(unit.local_unit, since) for unit in info.units):
+            output.put('out', f'Forwarded in {elapsed:.3f}s, {start} start')
+            if on_ready:
+                on_ready(elapsed)
+            return
+        if elapsed >= timeout:
+            return
+        await asyncio.sleep(interval)
+
+
+class Supervisor:
+    """Keep ssh running: restart it after an exit with a jittered exponential backoff.
+
+    Counts the reconnects, the downtime and the time to recover, i.e. from noticing a failure
+    until the local units listen again. `fail()` is the entry for the other failure detectors.
+    """
+
+    STABLE_AFTER = 30  # Seconds of a forward listening to reset the backoff
+
+    def __init__(self, cmd_args: list, info: TUIHeaderInfo, output: OutputQueue, event_loop: asyncio.AbstractEventLoop,
+                 on_status: Optional[Callable[[str], None]] = None, tag_line: Optional[Callable[[str], str]] = None,
+                 start: str = 'cold', restart: bool = True, backoff: float = 1, backoff_max: float = 60,
+                 watch_ready: bool = True, env: Optional[dict] = None):
+        self.cmd_args = cmd_args
+        self.info = info
+        self.output = output
+        self.event_loop = event_loop
+        self.on_status = on_status
+        self.tag_line = tag_line
+        self.line_observers = []  # The failure detectors and the timings watching the ssh output
+        self.start_kind = start
+        self.restart = restart
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.watch_ready = watch_ready  # Off for a fake ssh forwarding nothing
+        self.env = env
+
+        self.ssh = None
+        self.failures = 0  # In a row, for the backoff
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.down_since = None
+        self.recovered_in = None
+        self.restart_handle = None
+        self.stable_handle = None
+        self.ready_task = None
+        self.stopped = False
+
+    def start(self):
+        self.stopped = False
+        self.ssh = PtySsh(self.cmd_args, self.output, self.event_loop, on_exit=self._exited, tag_line=self.tag_line,
+                          on_line=self._observe_line, env=self.env)
+        self.ssh.start()
+        if self.watch_ready:
+            self.ready_task = self.event_loop.create_task(
+                watch_forward_ready(self.info, self.output, self.start_kind, on_ready=self._ready))
+        self._report('running')
+
+    def _observe_line(self, line: str):
+        for observe in self.line_observers:
+            observe(line)
+
+    def _ready(self, elapsed: float):
+        if self.ssh.process.poll() is not None:
+            return  # Something else listens there
+        if self.down_since is not None:
+            self.recovered_in = time.monotonic() - self.down_since
+            self.downtime += self.recovered_in
+            self.down_since = None
+            self.output.put('out', f'Recovered in {self.recovered_in:.3f}s')
+        if self.stable_handle:
+            self.stable_handle.cancel()
+        self.stable_handle = self.event_loop.call_later(self.STABLE_AFTER, self._stable)
+        self._report('running')
+
+    def _stable(self):
+        self.failures = 0
+
+    def _exited(self, code: int):
+        if self.restart:
+            self.fail('ssh is down')
+        else:
+            self._report(f'exited {code}')
+
+    def fail(self, reason: str):
+        if self.stopped or self.restart_handle:
+            return  # A restart is on the way
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        self._cancel_watchers()
+        self.ssh.on_exit = None
+        self.ssh.terminate()
+
+        delay = min(self.backoff_max, self.backoff * 2 ** self.failures)
+        delay = delay / 2 + random.uniform(0, delay / 2)  # Tunnels of a host don't reconnect at once
+        self.failures += 1
+        self.output.put('err', f'{reason}, restart in {delay:.1f}s')
+        self.restart_handle = self.event_loop.call_later(delay, self._restart)
+        self._report(f'down, restart in {delay:.1f}s')
+
+    def _restart(self):
+        self.restart_handle = None
+        self.reconnects += 1
+        self.start()
+
+    def _cancel_watchers(self):
+        """Cancel the readiness watcher and the backoff reset of the current ssh, a start brings new ones."""
+        if self.ready_task:
+            self.ready_task.cancel()
+        if self.stable_handle:
+            self.stable_handle.cancel()
+        self.ready_task = self.stable_handle = None
+
+    def stop(self):
+        self.stopped = True
+        if self.restart_handle:
+            self.restart_handle.cancel()
+            self.restart_handle = None
+        ready_task = self.ready_task
+        self._cancel_watchers()
+        if ready_task and not self.event_loop.is_running():  # Let the cancellation finish after the TUI quit
+            self.event_loop.run_until_complete(asyncio.gather(ready_task, return_exceptions=True))
+        if self.down_since is not None:  # A stopped ssh isn't down
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+        if self.ssh:
+            self.ssh.on_exit = None
+            self.ssh.terminate()
+
+    def status(self, state: str) -> str:
+        downtime = self.downtime + (time.monotonic() - self.down_since if self.down_since is not None else 0)
+        status = f'{state}, reconnects {self.reconnects}, downtime {downtime:.1f}s'
+        if self.recovered_in is not None:
+            status += f', recovered in {self.recovered_in:.1f}s'
+        return status
+
+    def _report(self, state: str):
+        if self.on_status:
+            self.on_status(self.status(state))
+
+
+class ProbeResult(str, Enum):
+    answered = 'answered'  # The data of a greeting protocol, the full round trip is timed
+    reachable = 'reachable'  # Silence until the timeout, e.g. HTTP: nothing to time past the local accept
+    closed = 'closed'  # An EOF, the channel or the remote connection failed
+    unreachable = 'unreachable'  # A connection error or timeout of the local unit
+
+
+class HealthProbe:
+    """Periodic end-to-end check of the forward: a connection to every local unit.
+
+    Ssh accepts a local connection at once and closes it if the channel or the remote connection fails,
+    so a probe waits for the first event: the data of a greeting protocol or an EOF.
+    Data is a success with the full round trip, an EOF or a connection error is a failure.
+    Silence until the timeout is a success without a round trip: it's counted as reachable,
+    not in the RTT percentiles.
+    """
+
+    def __init__(self, info: TUIHeaderInfo, event_loop: asyncio.AbstractEventLoop, interval: float = 10,
+                 timeout: float = 2, window: int = 100,
+                 on_status: Optional[Callable[[str], None]] = None, on_result: Optional[Callable[[list], None]] = None):
+        self.info = info
+        self.event_loop = event_loop
+        self.interval = interval
+        self.timeout = timeout
+        self.on_status = on_status
+        self.on_result = on_result
+        self.rtts = deque(maxlen=window)
+        self.reachable = 0
+        self.failures = 0
+        self.task = None
+
+    async def probe(self, unit: str) -> tuple:
+        """Return the result and the round trip time of an answered probe."""
+
+        started = time.monotonic()
+        address = unit_address(unit)
+        try:
+            if address:
+                connection = asyncio.open_connection(*address)
+            else:
+                connection = asyncio.open_unix_connection(unit)
+            reader, writer = await asyncio.wait_for(connection, self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return ProbeResult.unreachable, None
+
+        try:
+            data = await asyncio.wait_for(reader.read(1), self.timeout)
+            result = (ProbeResult.answered, time.monotonic() - started) if data else (ProbeResult.closed, None)
+        except asyncio.TimeoutError:
+            result = ProbeResult.reachable, None
+        except OSError:
+            result = ProbeResult.closed, None
+        writer.close()
+        return result
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            results = await asyncio.gather(*(self.probe(unit.local_unit) for unit in self.info.units))
+            failed = any(result in {ProbeResult.closed, ProbeResult.unreachable} for result, _ in results)
+            if failed:
+                self.failures += 1
+            self.reachable += sum(result == ProbeResult.reachable for result, _ in results)
+            self.rtts.extend(rtt for result, rtt in results if result == ProbeResult.answered)
+
+            if self.on_status:
+                self.on_status(self.status())
+            if self.on_result:
+                self.on_result([result for result, _ in results])
+
+    def percentile(self, percent: int) -> float:
+        rtts = sorted(self.rtts)
+        return rtts[round(percent / 100 * (len(rtts) - 1))]
+
+    def status(self) -> str:
+        parts = []
+        if self.rtts:
+            parts.append(f'rtt p50 {self.percentile(50) * 1000:.0f}ms p99 {self.percentile(99) * 1000:.0f}ms')
+        if self.reachable:
+            parts.append(f'reachable {self.reachable}')  # No greeting to time the round trip with
+        return ', '.join(parts + [f'probe failures {self.failures}'])
+
+    def start(self):
+        self.task = self.event_loop.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            if not self.event_loop.is_running():  # Let the cancellation finish after the TUI quit
+                self.event_loop.run_until_complete(asyncio.gather(self.task, return_exceptions=True))
+
+
+def ssh_socket_stalled(pid: int, forwarded_ports: frozenset = frozenset()) -> Optional[bool]:
+    """Look at the session of a ssh process to the server in /proc: True if it isn't established or
+    retransmits unacknowledged data, None if there is no such connection (a ControlMaster client)
+    or no /proc.
+
+    The listening forwards, the connections they accepted and any connection from or to a forwarded
+    port aren't the session: a local client or a remote service closing one half-closes it for a while.
+    """
+
+    def port(endpoint: str) -> int:
+        return int(endpoint.rpartition(':')[2], 16)
+
+    try:
+        inodes = set()
+        for fd in os.listdir(f'/proc/{pid}/fd'):
+            link = os.readlink(f'/proc/{pid}/fd/{fd}')
+            if link.startswith('socket:['):
+                inodes.add(link[8:-1])
+
+        sockets = []
+        for table in ('tcp', 'tcp6'):
+            with open(f'/proc/{pid}/net/{table}') as file:
+                next(file)  # A header
+                # sl local_address rem_address st tx_queue:rx_queue tr:tm->when retrnsmt uid timeout inode
+                sockets.extend(fields for fields in map(str.split, file) if fields[9] in inodes)
+        local_ports = set(forwarded_ports) | {port(fields[1]) for fields in sockets if fields[3] == '0A'}
+        connections = [fields for fields in sockets if fields[3] != '0A'
+                       and port(fields[1]) not in local_ports and port(fields[2]) not in local_ports]
+    except (OSError, IndexError, ValueError, StopIteration):
+        return None
+
+    if not connections:
+        return None
+    return any(state != '01' or int(queues.split(':')[0], 16) and int(retransmits, 16)
+               for _, _, _, state, queues, _, retransmits, *_ in connections)
+
+
+class Watchdog:
+    """Declare a tunnel stalled faster than `ServerAliveInterval` x `ServerAliveCountMax` and restart it.
+
+    A suspicion starts with a health probe not reaching a local unit or a ssh session in /proc that
+    isn't established or retransmits. It's cleared by a probe the server answered or a sign of life from
+    the server in the ssh output. A suspicion lasting the deadline is a stall.
+    A refused channel is a sign of life: the remote service is down, not ssh, and a restart won't help.
+    The pty output clears a suspicion only, its inactivity is no evidence: a healthy ssh is silent
+    for hours without `-v`.
+    """
+
+    LIFE_SIGNS = re.compile(r'receive packet|rcvd|client_input|open confirm|open failed|connect failed'
+                            r'|Local forwarding listening')
+    CHECK_INTERVAL = 1
+
+    def __init__(self, supervisor: 'Supervisor', event_loop: asyncio.AbstractEventLoop, deadline: float = 15):
+        self.supervisor = supervisor
+        self.event_loop = event_loop
+        self.deadline = deadline
+        self.suspected_since = None
+        self.probe_unreachable = False
+        self.handle = None
+        supervisor.line_observers.append(self.observe_line)
+
+    def observe_line(self, line: str):
+        if self.LIFE_SIGNS.search(line):
+            self.suspected_since = None
+
+    def observe_probe(self, results: list):
+        """Only an unreachable local unit is stall evidence. A greeting or an EOF is the server answering
+        the channel open, an EOF of a remote service down included. Silence tells nothing.
+        """
+        self.probe_unreachable = ProbeResult.unreachable in results
+        if not self.probe_unreachable and {ProbeResult.answered, ProbeResult.closed} & set(results):
+            self.suspected_since = None
+
+    def start(self):
+        self.suspected_since = None
+        self.probe_unreachable = False
+        self.handle = self.event_loop.call_later(self.CHECK_INTERVAL, self._check)
+
+    def _check(self):
+        self.handle = self.event_loop.call_later(self.CHECK_INTERVAL, self._check)
+        supervisor = self.supervisor
+        if supervisor.down_since is not None or supervisor.ssh is None:
+            self.suspected_since = None  # Down already, the supervisor restarts it
+            return
+
+        forwarded_ports = frozenset(address[1] for unit in supervisor.info.units
+                                    for address in [unit_address(unit.local_unit)] if address)
+        socket_stalled = ssh_socket_stalled(supervisor.ssh.process.pid, forwarded_ports)
+        if not (self.probe_unreachable or socket_stalled):
+            self.suspected_since = None
+        elif self.suspected_since is None:
+            self.suspected_since = time.monotonic()
+        elif time.monotonic() - self.suspected_since >= self.deadline:
+            reasons = ['probe unreachable'] * self.probe_unreachable + ['connection retransmits'] * bool(socket_stalled)
+            self.suspected_since = None
+            self.probe_unreachable = False
+            supervisor.fail(f'Stalled for {self.deadline:.0f}s: {", ".join(reasons)}')
+
+    def stop(self):
+        if self.handle:
+            self.handle.cancel()
+
+
+def private_units(info: TUIHeaderInfo, index: int = 0) -> TUIHeaderInfo:
+    """A copy of a tunnel forwarding its local units from the unix sockets only tunnel-runner connects to."""
+
+    CONTROL_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    units = [replace(unit, local_unit=str(CONTROL_DIR / f'relay-{os.getpid()}-{index}-{number}.sock'), forwards=[])
+             for number, unit in enumerate(info.units)]
+    units[0].forwards = units[1:]
+    return units[0]
+
+
+class RelayEngine(str, Enum):
+    splice = 'splice'
+    copy = 'copy'
+
+
+DEFAULT_RELAY_ENGINE = RelayEngine.splice if hasattr(os, 'splice') else RelayEngine.copy
+
+
+async def wait_fd(event_loop: asyncio.AbstractEventLoop, fd: int, writable: bool = False):
+    future = event_loop.create_future()
+    add, remove = (event_loop.add_writer, event_loop.remove_writer) if writable \
+                  else (event_loop.add_reader, event_loop.remove_reader)
+    add(fd, lambda: future.done() or future.set_result(None))
+    try:
+        await future
+    finally:
+        remove(fd)
+
+
+def abort_relay(*sockets: socket.socket):
+    """Shut a relayed connection down both ways, so the other direction wakes up with an EOF."""
+    for sock in sockets:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+async def copy_stream(event_loop: asyncio.AbstractEventLoop, source: socket.socket, target: socket.socket,
+                      on_data: Optional[Callable[[int], None]] = None, chunk: int = 256 * 1024):
+    """Copy one direction of a relayed connection through a reused buffer and pass its EOF on."""
+
+    buffer = bytearray(chunk)
+    view = memoryview(buffer)
+    try:
+        while size := await event_loop.sock_recv_into(source, buffer):
+            await event_loop.sock_sendall(target, view[:size])
+            if on_data:
+                on_data(size)
+        target.shutdown(socket.SHUT_WR)
+    except OSError:
+        abort_relay(source, target)
+
+
+async def splice_stream(event_loop: asyncio.AbstractEventLoop, source: socket.socket, target: socket.socket,
+                        on_data: Optional[Callable[[int], None]] = None, chunk: int = 1024 * 1024):
+    """Move one direction of a relayed connection through a pipe in the kernel, no copies to the userspace."""
+
+    read_end, write_end = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    try:
+        chunk = fcntl.fcntl(write_end, fcntl.F_SETPIPE_SZ, chunk)
+    except OSError:  # Over /proc/sys/fs/pipe-max-size for an unprivileged user
+        chunk = fcntl.fcntl(write_end, fcntl.F_GETPIPE_SZ)
+
+    flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+    try:
+        while True:
+            try:
+                size = os.splice(source.fileno(), write_end, chunk, flags=flags)
+            except BlockingIOError:
+                await wait_fd(event_loop, source.fileno())
+                continue
+            if not size:
+                break
+            if on_data:
+                on_data(size)
+            while size:
+                try:
+                    size -= os.splice(read_end, target.fileno(), size, flags=flags)
+                except BlockingIOError:
+                    await wait_fd(event_loop, target.fileno(), writable=True)
+        target.shutdown(socket.SHUT_WR)
+    except OSError:
+        abort_relay(source, target)
+    finally:
+        os.close(read_end)
+        os.close(write_end)
+
+
+RELAY_ENGINES = {RelayEngine.splice: splice_stream, RelayEngine.copy: copy_stream}
+
+
+def listen_unit(unit: str) -> socket.socket:
+    address = unit_address(unit)
+    if address:
+        listener = socket.create_server(address, family=socket.AF_INET6 if ':' in address[0] else socket.AF_INET,
+                                        backlog=128)
+    else:
+        if os.path.exists(unit) and stat.S_ISSOCK(os.stat(unit).st_mode):
+            os.unlink(unit)  # A stale one, as `StreamLocalBindUnlink` of ssh
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(unit)
+        listener.listen(128)
+    listener.setblocking(False)
+    return listener
+
+
+async def connect_unit(event_loop: asyncio.AbstractEventLoop, unit: str) -> socket.socket:
+    address = unit_address(unit)
+    family = (socket.AF_INET6 if ':' in address[0] else socket.AF_INET) if address else socket.AF_UNIX
+    sock = socket.socket(family)
+    sock.setblocking(False)
+    try:
+        await event_loop.sock_connect(sock, address or unit)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def relay_sockets(event_loop: asyncio.AbstractEventLoop, client: socket.socket, upstream: socket.socket,
+                        engine: RelayEngine = DEFAULT_RELAY_ENGINE,
+                        on_up: Optional[Callable[[int], None]] = None, on_down: Optional[Callable[[int], None]] = None):
+    relay_stream = RELAY_ENGINES[engine]
+    await asyncio.gather(relay_stream(event_loop, client, upstream, on_up),
+                         relay_stream(event_loop, upstream, client, on_down))
+
+
+def human_bytes(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            break
+        size /= 1024
+    return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+
+
+@dataclass
+class ConnectionRecord:
+    unit: str
+    opened: float  # Unix time
+    duration: float = 0.0
+    bytes_up: int = 0  # From the local client to the remote side
+    bytes_down: int = 0
+
+
+class TrafficMeter:
+    """Traffic of the relayed connections of a tunnel: bytes, durations and the concurrency.
+
+    The closed connections are kept for the report, the live throughput is averaged over a window of seconds.
+    """
+
+    def __init__(self, event_loop: asyncio.AbstractEventLoop, window: int = 5, history: int = 1000,
+                 on_status: Optional[Callable[[str], None]] = None):
+        self.event_loop = event_loop
+        self.on_status = on_status
+        self.closed = deque(maxlen=history)
+        self.open = 0
+        self.peak = 0
+        self.total = 0
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.samples = deque([(time.monotonic(), 0, 0)], maxlen=window + 1)
+        self.handle = None
+
+    def opened(self, unit: str) -> ConnectionRecord:
+        self.open += 1
+        self.total += 1
+        self.peak = max(self.peak, self.open)
+        return ConnectionRecord(unit=unit, opened=time.time())
+
+    def counter(self, record: ConnectionRecord, direction: str) -> Callable[[int], None]:
+        attribute = f'bytes_{direction}'
+
+        def count(size: int):
+            setattr(record, attribute, getattr(record, attribute) + size)
+            setattr(self, attribute, getattr(self, attribute) + size)
+
+        return count
+
+    def finished(self, record: ConnectionRecord):
+        self.open -= 1
+        record.duration = time.time() - record.opened
+        self.closed.append(record)
+
+    def throughput(self) -> tuple:
+        """Bytes per second up and down."""
+        (started, up_before, down_before), (now, up, down) = self.samples[0], self.samples[-1]
+        elapsed = now - started
+        if not elapsed:
+            return 0.0, 0.0
+        return (up - up_before) / elapsed, (down - down_before) / elapsed
+
+    def status(self) -> str:
+        up, down = self.throughput()
+        return f'up {human_bytes(up)}/s down {human_bytes(down)}/s, ' \
+               f'connections {self.open} peak {self.peak} total {self.total}, ' \
+               f'{human_bytes(self.bytes_up)} up {human_bytes(self.bytes_down)} down'
+
+    def _tick(self):
+        self.handle = self.event_loop.call_later(1, self._tick)
+        self.samples.append((time.monotonic(), self.bytes_up, self.bytes_down))
+        if self.on_status:
+            self.on_status(self.status())
+
+    def start(self):
+        self.handle = self.event_loop.call_later(1, self._tick)
+
+    def stop(self):
+        if self.handle:
+            self.handle.cancel()
+
+    def report(self) -> dict:
+        durations = sorted(record.duration for record in self.closed)
+        return {'connections_total': self.total, 'connections_open': self.open, 'concurrency_peak': self.peak,
+                'bytes_up': self.bytes_up, 'bytes_down': self.bytes_down,
+                'duration_p50': durations[len(durations) // 2] if durations else None,
+                'duration_max': durations[-1] if durations else None,
+                'connections': [vars(record) for record in self.closed]}
+
+
+class Balance(str, Enum):
+    round_robin = 'round-robin'
+    least_connections = 'least-connections'
+
+
+@dataclass
+class PoolMember:
+    """A ssh process of a relayed tunnel with its private units and its companions."""
+    private: TUIHeaderInfo
+    supervisor: Supervisor
+    companions: tuple = ()
+    on_status: Optional[Callable[[str], None]] = None
+    connections: int = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.supervisor.down_since is None and not self.supervisor.stopped
+
+
+class RelayTunnel:
+    """Listen to the local units in tunnel-runner and relay the connections to ssh forwarding the private ones.
+
+    It's the place for the traffic metering, for the pool of ssh processes sharing the connections,
+    and for the socket activation: an on-demand tunnel starts ssh on the first connection only.
+    The idle timeout after the last connection stops ssh with its companions, i.e. the health probe
+    and the watchdog, until the next connection.
+    """
+
+    READY_TIMEOUT = 60
+
+    def __init__(self, info: TUIHeaderInfo, members: List[PoolMember], output: OutputQueue,
+                 event_loop: asyncio.AbstractEventLoop, on_demand: bool = True, idle_timeout: float = 300,
+                 meter: Optional[TrafficMeter] = None, engine: RelayEngine = DEFAULT_RELAY_ENGINE,
+                 balance: Balance = Balance.least_connections):
+        self.info = info
+        self.members = members
+        self.output = output
+        self.event_loop = event_loop
+        self.on_demand = on_demand
+        self.idle_timeout = idle_timeout
+        self.meter = meter
+        self.engine = engine
+        self.balance = balance
+
+        self.listeners = []
+        self.sockets = []
+        self.tasks = set()
+        self.connections = 0
+        self.turn = 0
+        self.active = False
+        self.since = None
+        self.idle_handle = None
+
+    def start(self):
+        for index, unit in enumerate(self.info.units):
+            try:
+                listener = listen_unit(unit.local_unit)
+            except OSError as error:
+                self.stop()
+                raise BadParameter(f'Cannot listen to {unit.local_unit}: {error.strerror}',
+                                   param_hint='--on-demand' if self.on_demand else '--meter')
+            self.listeners.append(listener)
+            if not unit_address(unit.local_unit):
+                self.sockets.append(unit.local_unit)
+            self._spawn(self._accept(listener, index))
+
+        if self.meter:
+            self.meter.start()
+        if self.on_demand:
+            self.output.put('out', f'Listening to {", ".join(unit.local_unit for unit in self.info.units)}, '
+                                   f'ssh starts on the first connection')
+            self._report('idle')
+        else:
+            self._activate()
+
+    def _spawn(self, coroutine):
+        task = self.event_loop.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _accept(self, listener: socket.socket, index: int):
+        while True:
+            client, _ = await self.event_loop.sock_accept(listener)
+            self._spawn(self._relay(client, index))
+
+    def _choose(self) -> PoolMember:
+        members = [member for member in self.members if member.healthy] or self.members
+        if self.balance == Balance.least_connections:
+            return min(members, key=lambda member: member.connections)
+        self.turn += 1
+        return members[self.turn % len(members)]
+
+    async def _relay(self, client: socket.socket, index: int):
+        self._connected()
+        member = self._choose()
+        member.connections += 1
+        private_unit = member.private.units[index].local_unit
+        record = self.meter.opened(self.info.units[index].local_unit) if self.meter else None
+        upstream = None
+        try:
+            if not await self._wait_ready(private_unit):
+                self.output.put('err', f'{private_unit} does not listen in {self.READY_TIMEOUT}s, '
+                                       f'a connection dropped')
+                return
+            upstream = await connect_unit(self.event_loop, private_unit)
+            await relay_sockets(self.event_loop, client, upstream, self.engine,
+                                on_up=record and self.meter.counter(record, 'up'),
+                                on_down=record and self.meter.counter(record, 'down'))
+        except OSError as error:
+            self.output.put('err', f'Relay to {private_unit} failed: {error}')
+        finally:
+            client.close()
+            if upstream:
+                upstream.close()
+            if record:
+                self.meter.finished(record)
+            member.connections -= 1
+            self._disconnected()
+
+    async def _wait_ready(self, private_unit: str) -> bool:
+        started = time.monotonic()
+        while not unit_is_listening(private_unit, self.since):
+            if time.monotonic() - started > self.READY_TIMEOUT:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def _activate(self):
+        self.active = True
+        self.since = time.time() - 1  # ctime granularity
+        for member in self.members:
+            member.supervisor.start()
+            for companion in member.companions:
+                companion.start()
+
+    def _connected(self):
+        self.connections += 1
+        if self.idle_handle:
+            self.idle_handle.cancel()
+            self.idle_handle = None
+        if not self.active:
+            self.output.put('out', 'A connection, starting ssh')
+            self._activate()
+
+    def _disconnected(self):
+        self.connections -= 1
+        if self.on_demand and self.active and not self.connections and self.idle_timeout:
+            self.idle_handle = self.event_loop.call_later(self.idle_timeout, self._idle)
+
+    def _idle(self):
+        self.idle_handle = None
+        self.active = False
+        self.output.put('out', f'No connections for {self.idle_timeout:g}s, stopping ssh')
+        for member in self.members:
+            for companion in member.companions:
+                companion.stop()
+            member.supervisor.stop()
+        self._report('idle')
+
+    def stop(self):
+        if self.idle_handle:
+            self.idle_handle.cancel()
+        if self.meter:
+            self.meter.stop()
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks and not self.event_loop.is_running():  # Let the relays finish after the TUI quit
+            self.event_loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        for listener in self.listeners:
+            listener.close()
+        private_sockets = [unit.local_unit for member in self.members for unit in member.private.units]
+        for path in self.sockets + private_sockets:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _report(self, state: str):
+        for member in self.members:
+            if member.on_status:
+                member.on_status(member.supervisor.status(state))
+
+
+def metrics_report(info: TUIHeaderInfo, meter: TrafficMeter) -> dict:
+    return {'ssh_host': info.remote_name,
+            'forwards': [{'target': unit.local_name, 'local_unit': unit.local_unit, 'remote_unit': unit.remote_unit}
+                         for unit in info.units],
+            **meter.report()}
+
+
+class StatusLine:
+    """A status text of parts, each updated by its owner.
+
+    The parts are updated from asyncio callbacks urwid doesn't know about, so a redraw is requested
+    with a no-op alarm: the loop redraws after its own callbacks.
+    """
+
+    def __init__(self, set_text: Callable[[str], None], loop: urwid.MainLoop):
+        self.set_text = set_text
+        self.loop = loop
+        self.parts = {}
+
+    def updater(self, name: str, label: str = '') -> Callable[[str], None]:
+        self.parts.setdefault(name, '')  # Keep the order of the parts
+        return lambda text: self.update(name, f'{label} {text}' if label else text)
+
+    def update(self, name: str, text: str):
+        self.parts[name] = text
+        self.set_text(' | '.join(part for part in self.parts.values() if part))
+        self.loop.set_alarm_in(0, lambda *args: None)
+
+
+PALETTE = [
+    # structure: name, foreground, background, mono, foreground_high, background_high
+    ('header', 'black', 'white'),
+    # ('footer', 'white', ''),
+    ('footer', 'black', 'white'),
+    ('parameter', 'light red,bold', 'white'),
+    ('out', 'light green', ''),
+    ('err', 'light red', ''),
+]
+
+
+def resolve_tunnel(settings: Dynaconf, ssh_host: str, target: str, **replacements) -> TUIHeaderInfo:
+    """Take a target from the known and replace its default values with the provided ones."""
+
+    cfg_params = settings.targets[target]
+    for name, value in replacements.items():
+        if value:
+            cfg_params.update({name: value})
+
+    # Generalize TCP or Unix to a unit
+    local_unit = cfg_params.local_sock \
+                 if cfg_params.get('local_sock') \
+                 else f'{cfg_params.local_address}:{cfg_params.local_port}'
+    remote_unit = cfg_params.remote_sock \
+                  if cfg_params.get('remote_sock') \
+                  else f'{cfg_params.remote_address}:{cfg_params.remote_port}'
+
+    return TUIHeaderInfo(local_unit=local_unit,
+                         local_name=target,
+                         remote_unit=remote_unit,
+                         remote_name=ssh_host)
+
+
+def build_cmd_args(info: TUIHeaderInfo, verbose: str) -> list:
+    cmd_args = CMD_TEMPLATE.format(verbose=verbose, local_unit=info.local_unit,
+                                   remote_unit=info.remote_unit, ssh_host=info.remote_name) \
+                           .split()
+    for forward in info.forwards:
+        cmd_args.extend(['-L', f'{forward.local_unit}:{forward.remote_unit}'])
+    cmd_args.extend(['-o', 'StreamLocalBindUnlink=yes'])  # Make ssh run with an existent unix socket
+    return cmd_args
+
+
+def header_markup(info: TUIHeaderInfo) -> list:
+    markup = []
+    for unit in info.units:
+        markup.extend([', ' if markup else '',
+                       ('parameter', unit.local_unit),
+                       '[',
+                       ('parameter', unit.local_name),
+                       ']',
+                       ' => ',
+                       ('parameter', unit.remote_unit),
+                       '[',
+                       ('parameter', unit.remote_name),
+                       ']',
+                       ])
+    return markup
+
+
+class ForwardAttribution:
+    """Prefix the ssh log lines about a forward with its target name, for an ssh forwarding several units.
+
+    A line is attributed by the local unit in the phrasing ssh uses for the local side, so the remote
+    units and the client ports of the other forwards don't count. A channel opened right after
+    a forwarding request is remembered, so the later lines of the channel are attributed too.
+    """
+
+    CHANNEL = re.compile(r'channel (\d+): ')
+    LOCAL_PORT = (r'Local connections to \S*:{port} ', r'listening on \S+ port {port}\b', r'Connection to port {port} ',
+                  r'listening port {port} ', r'cannot listen to port: {port}\b')
+    LOCAL_PATH = (r'Local connections to {path}:', r'listening on path {path}\.')
+
+    def __init__(self, info: TUIHeaderInfo):
+        self.patterns = []
+        for unit in info.units:
+            address, _, port = unit.local_unit.rpartition(':')
+            phrases = [phrase.format(port=port) for phrase in self.LOCAL_PORT] if address and port.isdigit() \
+                      else [phrase.format(path=re.escape(unit.local_unit)) for phrase in self.LOCAL_PATH]
+            self.patterns.append((re.compile('|'.join(phrases)), unit.local_name))
+        self.channels = {}
+        self.requested = None
+
+    def __call__(self, line: str) -> str:
+        channel = self.CHANNEL.search(line)
+        name = next((name for pattern, name in self.patterns if pattern.search(line)), None)
+        if channel:
+            number = channel.group(1)
+            if name is None:
+                name = self.channels.get(number)
+            if name is None and ': new ' in line and self.requested:
+                name, self.requested = self.requested, None
+            if name:
+                self.channels[number] = name
+            if ': free: ' in line:
+                self.channels.pop(number, None)
+        elif name and line.rstrip().endswith('requested.'):
+            self.requested = name  # A channel for it comes next
+
+        return f'[{name}] {line}' if name else line
+
+
+def exit_on_q(key):
+    if key in ('q', 'Q'):
+        raise urwid.ExitMainLoop()
+
+
+def follow_output(loop: urwid.MainLoop, output: OutputQueue, list_walker: ScrollbackWalker, fps: int):
+    """Move the output lines to the list walker and focus the last one at most once a frame."""
+
+    frame_alarm = None
+
+    def wake_up(data):
+        nonlocal frame_alarm
+        loop.woken = True  # Nothing to redraw yet, the frame alarm drains and redraws
+        if frame_alarm is None:  # A redraw at most once a frame however many lines come
+            frame_alarm = loop.set_alarm_in(1 / fps, show_pending)
+
+    def show_pending(*args):
+        nonlocal frame_alarm
+        frame_alarm = None
+        loop.frame_due = True
+        pending = output.drain()
+        if not pending:
+            return
+
+        for style, line in pending:
+            list_walker.add(style, line.strip())
+        list_walker.set_focus(list_walker.last_position)
+
+    output.wakeup_fd = loop.watch_pipe(wake_up)
+
+
+class FrameLoopMixin:
+    """A MainLoop skipping the redraw after the `follow_output()` wake-ups, `FrameLoop` of `import_urwid()`.
+
+    urwid redraws after every callback, and a wake-up only sets the frame alarm, so its redraw
+    would double the `--fps` cap. A key press coming with a wake-up is drawn by that frame alarm.
+    """
+
+    woken = frame_due = False
+
+    def entering_idle(self):
+        if self.frame_due or not self.woken:
+            super().entering_idle()
+        self.woken = self.frame_due = False
+
+
+class HeadlessScreenMixin:
+    """A screen of a set size rendering the canvases for nothing, `HeadlessScreen` of `import_urwid()`.
+
+    No input: `resize()` sends the window resize event a terminal would.
+    """
+
+    def __init__(self, cols: int = 100, rows: int = 40, on_draw: Optional[Callable[[], None]] = None):
+        super().__init__()
+        self.size = (cols, rows)
+        self.on_draw = on_draw
+        self.draws = 0
+        self.on_input = None
+
+    def get_cols_rows(self) -> tuple:
+        return self.size
+
+    def hook_event_loop(self, event_loop: urwid.EventLoop, callback: Callable[[list, list], None]):
+        self.on_input = callback
+
+    def unhook_event_loop(self, event_loop: urwid.EventLoop):
+        self.on_input = None
+
+    def draw_screen(self, size: tuple, canvas: urwid.Canvas):
+        for row in canvas.content():  # The work of a real screen short of the escape sequences
+            pass
+        self.draws += 1
+        if self.on_draw:
+            self.on_draw()
+
+    def resize(self, cols: int, rows: int):
+        self.size = (cols, rows)
+        if self.on_input:
+            self.on_input(['window resize'], [])
+
+
+ScrollbackWalker = FrameLoop = HeadlessScreen = None  # The urwid classes, built by `import_urwid()`
+
+
+def import_urwid():
+    """Import urwid and build the classes based on it, on the first call of a TUI path.
+
+    `--help`, the shell completion and the headless commands don't load it at all.
+    """
+    global urwid, ScrollbackWalker, FrameLoop, HeadlessScreen
+    if urwid is not None:
+        return
+    import urwid as module
+    STARTUP_TIMINGS.mark('import urwid')
+    urwid = module
+    ScrollbackWalker = type('ScrollbackWalker', (ScrollbackWalkerMixin, urwid.ListWalker), {})
+    FrameLoop = type('FrameLoop', (FrameLoopMixin, urwid.MainLoop), {})
+    HeadlessScreen = type('HeadlessScreen', (HeadlessScreenMixin, urwid.BaseScreen), {})
+
+
+def create_tui_loop(info: TUIHeaderInfo, output: OutputQueue,
+                    list_walker: Optional[ScrollbackWalker] = None, fps: int = 30,
+                    event_loop: Optional[urwid.EventLoop] = None,
+                    commands: Optional[dict] = None, status: Optional[urwid.Text] = None,
+                    screen: Optional[urwid.BaseScreen] = None):
+    """`commands` maps a key to a prompt and a callback taking the entered text,
+    the header is refreshed after a callback as it may change the info.
+    `status` is a text under the tunnel info its owner updates.
+    `screen` replaces the terminal one, e.g. a `HeadlessScreen`.
+    """
+
+    commands = commands or {}
+    if list_walker is None:  # Not `or`: an empty walker is falsy and the bounds given with it would be lost
+        list_walker = ScrollbackWalker()
+    tunnel_output = urwid.ListBox(list_walker)
+    tunnel_info = urwid.Text(['SSH Forward Tunnel ', *header_markup(info)])
+    tui_help = urwid.Text(''.join(f'Press `{key}` to {prompt.lower().rstrip(": ")}. '
+                                  for key, (prompt, _) in commands.items())
+                          + 'Navigation `Up`, `Down`, `PageUp`, `PageDown`, `Home`, `End`. Press `q` or `Q` to quit.',
+                          wrap='clip')
+    footer = urwid.AttrMap(tui_help, 'footer')
+    header = urwid.Pile([tunnel_info, status]) if status else tunnel_info
+    frame = urwid.Frame(header=urwid.AttrMap(header, 'header'),
+                        body=tunnel_output,
+                        footer=footer)
+    prompted = None
+
+    def handle_keys(key):
+        nonlocal prompted
+        if prompted:
+            if key == 'enter':
+                callback = commands[prompted][1]
+                callback(frame.footer.base_widget.edit_text.strip())
+                tunnel_info.set_text(['SSH Forward Tunnel ', *header_markup(info)])
+            if key in ('enter', 'esc'):
+                prompted = None
+                frame.footer = footer
+                frame.focus_position = 'body'
+        elif key in commands:
+            prompted = key
+            frame.footer = urwid.AttrMap(urwid.Edit(commands[key][0]), 'footer')
+            frame.focus_position = 'footer'
+        else:
+            exit_on_q(key)
+
+    loop = FrameLoop(frame, PALETTE, screen=screen, unhandled_input=handle_keys, event_loop=event_loop)
+    follow_output(loop, output, list_walker, fps)
+
+    return loop
+
+
+def forward_commands(master: ControlMaster, settings: Dynaconf, info: TUIHeaderInfo, output: OutputQueue) -> dict:
+    """TUI commands adding and cancelling the forwards of targets on a live master without restarting ssh."""
+
+    def control(operation, target):
+        if target not in settings.targets:
+            output.put('err', f'No target {target!r} in the config')
+            return
+
+        known = next((unit for unit in info.units if unit.local_name == target), None)
+        if operation == 'forward' and known:
+            output.put('err', f'{target} is forwarded already')
+            return
+        elif operation == 'cancel' and not known:
+            output.put('err', f'{target} is not forwarded')
+            return
+        elif operation == 'cancel' and known is info:  # The header keeps it
+            output.put('err', f'{target} is the tunnel own target, quit to cancel it')
+            return
+
+        unit = known or resolve_tunnel(settings, master.ssh_host, target)
+        error = master.control_forward(operation, unit)
+        if error:
+            output.put('err', f'{operation.capitalize()} {target}: {error}')
+        elif operation == 'forward':
+            info.forwards.append(unit)
+            output.put('out', f'Forwarded {unit.local_unit} => {unit.remote_unit} [{target}]')
+        else:
+            info.forwards.remove(unit)
+            output.put('out', f'Cancelled {unit.local_unit} => {unit.remote_unit} [{target}]')
+
+    return {'a': ('Add a forward of a target: ', lambda target: control('forward', target)),
+            'c': ('Cancel a forward of a target: ', lambda target: control('cancel', target))}
+
+
+@dataclass
+class TunnelPane:
+    info: TUIHeaderInfo
+    output: OutputQueue
+    list_walker: ScrollbackWalker
+    status: str = 'starting'
+
+
+def create_multi_tui_loop(panes: List[TunnelPane], fps: int = 30, event_loop: Optional[urwid.EventLoop] = None):
+    """A status row per tunnel in the header and the log pane of the selected tunnel.
+
+    Returns the loop and a function to call after a pane status changes.
+    """
+
+    status_rows = [urwid.Text('', wrap='clip') for _ in panes]
+    tunnel_outputs = [urwid.ListBox(pane.list_walker) for pane in panes]
+    tui_help = urwid.Text('Select a tunnel with `Tab`, `Shift+Tab`, `1`-`9`. '
+                          'Navigation `Up`, `Down`, `PageUp`, `PageDown`, `Home`, `End`. Press `q` or `Q` to quit.',
+                          wrap='clip')
+    frame = urwid.Frame(header=urwid.AttrMap(urwid.Pile(status_rows), 'header'),
+                        body=tunnel_outputs[0],
+                        footer=urwid.AttrMap(tui_help, 'footer'))
+    selected = 0
+
+    def refresh_status():
+        for index, (pane, row) in enumerate(zip(panes, status_rows)):
+            row.set_text(['>' if index == selected else ' ', f' {index + 1} {pane.status} ',
+                          *header_markup(pane.info)])
+
+    def select(index):
+        nonlocal selected
+        selected = index % len(panes)
+        frame.body = tunnel_outputs[selected]
+        refresh_status()
+
+    def handle_keys(key):
+        if key == 'tab':
+            select(selected + 1)
+        elif key == 'shift tab':
+            select(selected - 1)
+        elif key in {str(number) for number in range(1, min(len(panes), 9) + 1)}:
+            select(int(key) - 1)
+        else:
+            exit_on_q(key)
+
+    refresh_status()
+    loop = FrameLoop(frame, PALETTE, unhandled_input=handle_keys, event_loop=event_loop)
+    for pane in panes:
+        follow_output(loop, pane.output, pane.list_walker, fps)
+
+    return loop, refresh_status
+
+
+@cli.command()
+def run(ssh_host: str = Argument(None, show_default=False, autocompletion=Autocompletion('ssh_hosts').do,
+                                 help="A ssh_host name from the util's config. "
+                                      "Has to be a valid HostName in an ssh config file"),
+        target: str = Argument(None, show_default=False, autocompletion=Autocompletion('targets').do,
+                               help="A target name from the util's config"),
+        verbose: str = Option('v', help='Ssh cli verbose mode. See `ssh --help`'),
+        local_address: str = Option(None, show_default=False, help='Local addr to listen to.',
+                                    rich_help_panel='Target options to replace'),
+        local_port: int = Option(None, show_default=False, help='Local port to listen to.',
+                                 rich_help_panel='Target options to replace'),
+        remote_address: str = Option(None, show_default=False, help='Addr on a remote server to forward to.',
+                                     rich_help_panel='Target options to replace'),
+        remote_port: int = Option(None, show_default=False, help='Port on a remote server to forward to.',
+                                  rich_help_panel='Target options to replace'),
+        local_sock: str = Option(None, show_default=False, help='Local unix socket to listen to.',
+                                 rich_help_panel='Target options to replace'),
+        remote_sock: str = Option(None, show_default=False, help='Unix socket on a remote server to forward to.',
+                                  rich_help_panel='Target options to replace'),
+        config: Path = Option(CONFIG_FILE, rich_help_panel='Config options',
+        help="""The `tunnel-runner.toml` config in the `XDG_CONFIG_HOME` or `HOME/.config` dir\n
+                Config pattern of the TOML format:\n
+                ```\n
+                [ssh_hosts."host.name"]  # A valid ssh_config `Host` value prefixed with `ssh_hosts`\n
+                description = "Helpful description to display in an autocompletion list."\n\n
+
+                [targets.service-name]  # An arbitrary name of valid TOML key prefixed with `targets`\n
+                local_address = "127.0.0.1"\n
+                local_port = 8080\n
+                remote_address = "127.0.0.1"\n
+                remote_port = 8080\n
+                description = "Helpful description to display in an autocompletion list."\n
+                ```
+        """),
+        scrollback_lines: int = Option(10000, help='Tunnel log lines to keep in the TUI. 0 is unlimited.',
+                                       rich_help_panel='TUI options'),
+        scrollback_bytes: int = Option(0, help='Tunnel log bytes to keep in the TUI. 0 is unlimited.',
+                                       rich_help_panel='TUI options'),
+        spill_file: Path = Option(None, show_default=False, help='A file to append the evicted log lines to.',
+                                  rich_help_panel='TUI options'),
+        fps: int = Option(30, min=1, help='Max TUI redraws per second while the log floods.',
+                          rich_help_panel='TUI options'),
+        output_queue: int = Option(10000, min=1, help='Ssh output lines waiting for the TUI at most.',
+                                   rich_help_panel='TUI options'),
+        overflow: Overflow = Option(Overflow.drop_oldest.value, help='What to drop when the TUI falls behind.',
+                                    rich_help_panel='TUI options'),
+        record: Path = Option(None, show_default=False, help='A file to record the log lines to with their times '
+                                                             'for `replay`.', rich_help_panel='TUI options'),
+        driver: Driver = Option(Driver.asyncio.value, help='Run ssh on the TUI asyncio loop or on sh threads.'),
+        show_timings: bool = Option(False, '--timings', help='Report how long each startup phase took, '
+                                                             'in the log once the forward listens and on exit.'),
+        reconnect: bool = Option(True, help='Restart ssh after it exits, with a backoff. The asyncio driver only.'),
+        probe_interval: float = Option(0, help='Seconds between the health probes through the forward, '
+                                               'each one a connection to the remote service. The RTT and failures '
+                                               'are shown in the header. 0 disables.',
+                                       rich_help_panel='Health options'),
+        probe_timeout: float = Option(2, help='Seconds to wait for a probe connection and its first byte.',
+                                      rich_help_panel='Health options'),
+        stall_deadline: float = Option(15, help='Seconds of failed probes or a retransmitting ssh connection '
+                                                'to restart a stalled tunnel. 0 disables.',
+                                       rich_help_panel='Health options'),
+        on_demand: bool = Option(False, help='Listen to the local unit and start ssh on the first connection. '
+                                             'The asyncio driver only.',
+                                 rich_help_panel='On-demand options'),
+        idle_timeout: float = Option(300, help='Seconds without connections to stop an on-demand ssh. 0 never.',
+                                     rich_help_panel='On-demand options'),
+        meter: bool = Option(False, help='Relay the connections through tunnel-runner and show the throughput, '
+                                         'bytes and connections. The asyncio driver only.',
+                             rich_help_panel='Metering options'),
+        metrics_file: Path = Option(None, show_default=False, help='A JSON file to write the traffic metrics '
+                                                                   'to on exit. Turns `--meter` on.',
+                                    rich_help_panel='Metering options'),
+        relay_engine: RelayEngine = Option(DEFAULT_RELAY_ENGINE.value,
+                                           help='How `--on-demand` and `--meter` move the bytes: `splice` in the '
+                                                'kernel or `copy` through a userspace buffer.',
+                                           rich_help_panel='Metering options'),
+        pool: int = Option(1, min=1, help='Ssh connections sharing the local connections of the tunnel. '
+                                          'Each one brings a core of crypto and a TCP window of its own.',
+                           rich_help_panel='Pool options'),
+        balance: Balance = Option(Balance.least_connections.value, help='How a pool shares the connections.',
+                                  rich_help_panel='Pool options'),
+        multiplex: bool = Option(False, help='Share a ssh ControlMaster per ssh_host, so the next tunnels '
+                                             'to it skip the connection and authentication.',
+                                 rich_help_panel='Multiplexing options'),
+        control_persist: str = Option('10m', help='How long the master outlives its last tunnel. '
+                                                  'See `ControlPersist` of `man ssh_config`.',
+                                      rich_help_panel='Multiplexing options'),
+        ):
+    """Establish an SSH forward tunnel. Highlight the tunnel info.
+    Track the tunnel logs. Navigate them up and down.
+    Autocomplete the arguments from a config file.
+
+    First of all, a target is taken from the known
+    and its default value is replaced with an according option if provided.
+    """
+    timings = STARTUP_TIMINGS
+    timings.mark('cli parsing')
+
+    settings = Dynaconf(settings_file=config)  # TODO Validation
+    settings.get(SECTION_TARGETS)  # Dynaconf loads on the first access
+    timings.mark('config load')
+
+    tui_info = resolve_tunnel(settings, ssh_host, target,
+                              local_address=local_address, local_port=local_port,
+                              remote_address=remote_address, remote_port=remote_port,
+                              local_sock=local_sock, remote_sock=remote_sock)
+    timings.mark('target resolution')
+    meter = meter or bool(metrics_file)
+    relayed = on_demand or meter or pool > 1
+    if relayed and driver != Driver.asyncio:
+        raise BadParameter('The relay of `--on-demand`, `--meter` and `--pool` needs the asyncio driver',
+                           param_hint='--driver')
+    if pool > 1 and multiplex:
+        raise BadParameter('A pool needs connections of its own, not a shared master', param_hint='--pool')
+    ssh_infos = [private_units(tui_info, number) for number in range(pool)] if relayed else [tui_info]
+    cmd_args = build_cmd_args(ssh_infos[0], verbose)
+
+    import_urwid()
+    scrollback = ScrollbackWalker(max_lines=scrollback_lines, max_bytes=scrollback_bytes, spill_file=spill_file)
+    recorder = SessionRecorder(record, tui_info) if record else None
+    output = OutputQueue(max_lines=output_queue, overflow=overflow, recorder=recorder)
+
+    master = ControlMaster(ssh_host, control_persist) if multiplex else None
+    start = 'cold'
+    if master:
+        start = 'warm' if master.is_alive() else 'cold'
+        cmd_args.extend(master.options())
+
+    commands = forward_commands(master, settings, tui_info, output) if master else None
+
+    members, relay = [], None
+    asyncio_loop = asyncio.new_event_loop()  # The sh driver polls the forward on it too
+    try:
+        if driver == Driver.asyncio:
+            status = urwid.Text('')
+            loop = create_tui_loop(tui_info, output, scrollback, fps, urwid.AsyncioEventLoop(loop=asyncio_loop),
+                                   commands, status)
+            status_line = StatusLine(status.set_text, loop)
+            timings.mark('TUI construction')
+
+            for number, ssh_info in enumerate(ssh_infos):
+                label = f'#{number + 1}' if pool > 1 else ''  # Tell the members of a pool apart
+                on_status = status_line.updater(f'ssh{label}', label)
+                supervisor = Supervisor(cmd_args if not number else build_cmd_args(ssh_info, verbose),
+                                        ssh_info, output, asyncio_loop, on_status=on_status,
+                                        tag_line=(lambda line, label=label: f'[{label}] {line}') if label else None,
+                                        start=start, restart=reconnect)
+                watchdog = Watchdog(supervisor, asyncio_loop, stall_deadline)
+                probe = HealthProbe(ssh_info, asyncio_loop, probe_interval, probe_timeout,
+                                    on_status=status_line.updater(f'probe{label}', label),
+                                    on_result=watchdog.observe_probe)
+                companions = (probe,) * bool(probe_interval) + (watchdog,) * bool(stall_deadline and reconnect)
+                members.append(PoolMember(ssh_info, supervisor, companions, on_status))
+            if show_timings:
+                members[0].supervisor.line_observers.append(lambda line: show_startup(output, line))
+
+            traffic = TrafficMeter(asyncio_loop, on_status=status_line.updater('traffic')) if meter else None
+            if relayed:
+                relay = RelayTunnel(tui_info, members, output, asyncio_loop, on_demand, idle_timeout,
+                                    traffic, relay_engine, balance)
+                relay.start()
+            else:
+                members[0].supervisor.start()
+                for companion in members[0].companions:
+                    companion.start()
+            timings.mark('ssh spawn' if not on_demand else 'listen')
+            loop.run()
+        else:
+            loop = create_tui_loop(tui_info, output, scrollback, fps, urwid.AsyncioEventLoop(loop=asyncio_loop),
+                                   commands=commands)
+            timings.mark('TUI construction')
+            run_with_sh(loop=loop, event_loop=asyncio_loop, cmd_args=cmd_args, output=output, info=tui_info,
+                        start=start, on_line=(lambda line: show_startup(output, line)) if show_timings else None)
+    finally:  # Ssh runs in a session of its own, it would outlive an exception of the TUI
+        for member in members:
+            for companion in member.companions:
+                companion.stop()
+        if relay:
+            relay.stop()
+        for member in members:
+            member.supervisor.stop()
+        asyncio_loop.close()
+        if master:  # The master keeps the forwards of its clients
+            master.cancel(ssh_infos[0])  # The private units of a relay
+            if relayed:
+                for forward in tui_info.forwards:  # Added in the TUI, public ones
+                    master.control_forward('cancel', forward)
+        if recorder:
+            recorder.close()
+
+    if metrics_file:
+        metrics_file.write_text(json.dumps([metrics_report(tui_info, traffic)], indent=2))
+    if show_timings:
+        print(timings.report())
+
+
+def show_startup(output: OutputQueue, line: str):
+    """Put the startup timings to the log once the forward listens."""
+    if STARTUP_TIMINGS.observe_line(line):
+        output.put('out', 'Startup: ' + ', '.join(f'{phase} {seconds * 1000:.0f}ms'
+                                                   for phase, seconds in STARTUP_TIMINGS.phases))
+
+
+def run_with_sh(loop: urwid.MainLoop, event_loop: asyncio.AbstractEventLoop, cmd_args: list, output: OutputQueue,
+                info: TUIHeaderInfo, start: str, on_line: Optional[Callable[[str], None]] = None):
+    """Run ssh on the sh threads."""
+
+    def interact_with_loop(line, in_queue, style):
+        output.put(style, line)
+        if on_line:
+            on_line(line)
+        # print('Line: ', line)
+
+        if line.startswith('Are you sure you want'):
+            in_queue.put('yes\n')
+
+        # elif line.startswith('This key is not known by'):
+        #     output.put(style, 'Truncated...')
+
+    import sh  # Only the sh driver needs it
+    STARTUP_TIMINGS.mark('import sh')
+
+    # TODO reset or a normal quit without exception `ProcessLookupError: [Errno 3] No such process`
+    cmd = sh.ssh(*cmd_args,
+                 _out=lambda line, in_queue: interact_with_loop(line, in_queue, 'out'),
+                 _err=lambda line, in_queue: interact_with_loop(line, in_queue, 'err'),
+                 _bg=True,
+                 _bg_exc=False,
+                 _tty_in=True,
+                 _tty_out=True,
+                 _unify_ttys=True,
+                 _no_out=True,
+                 _no_err=True,
+                 _no_pipe=True,
+                 _out_bufsize=1,
+                 _err_bufsize=1,
+                 _in_bufsize=1,
+                 _internal_bufsize=0
+                 )
+    STARTUP_TIMINGS.mark('ssh spawn')
+
+    ready_task = event_loop.create_task(watch_forward_ready(info, output, start))
+    try:
+        loop.run()
+    finally:
+        ready_task.cancel()
+        event_loop.run_until_complete(asyncio.gather(ready_task, return_exceptions=True))
+        try:
+            cmd.terminate()
+            cmd.wait()
+        except (sh.SignalException_SIGTERM, ProcessLookupError):
+            pass
+
+
+@cli.command()
+def multi(tunnels: List[str] = Argument(None, show_default=False,
+                                        help='`ssh_host:target` pairs of the names from the config.'),
+          group: str = Option(None, show_default=False,
+                              help='A group name from the config. Its `tunnels` list is added to the pairs: '
+                                   '`[groups.name]` `tunnels = ["host.name:service-name", ...]`.'),
+          verbose: str = Option('v', help='Ssh cli verbose mode. See `ssh --help`'),
+          scrollback_lines: int = Option(10000, help='Log lines to keep per tunnel. 0 is unlimited.',
+                                         rich_help_panel='TUI options'),
+          scrollback_bytes: int = Option(0, help='Log bytes to keep per tunnel. 0 is unlimited.',
+                                         rich_help_panel='TUI options'),
+          fps: int = Option(30, min=1, help='Max TUI redraws per second while the logs flood.',
+                            rich_help_panel='TUI options'),
+          output_queue: int = Option(10000, min=1, help='Ssh output lines waiting for the TUI at most per tunnel.',
+                                     rich_help_panel='TUI options'),
+          overflow: Overflow = Option(Overflow.drop_oldest.value, help='What to drop when the TUI falls behind.',
+                                      rich_help_panel='TUI options'),
+          group_forwards: bool = Option(True, help='Forward all the targets of an ssh_host with one ssh process: '
+                                                   'one connection and authentication instead of one per target.'),
+          reconnect: bool = Option(True, help='Restart ssh after it exits, with a backoff.'),
+          probe_interval: float = Option(0, help='Seconds between the health probes through the forward, '
+                                                 'each one a connection to the remote service. The RTT and failures '
+                                                 'are shown in the status. 0 disables.',
+                                         rich_help_panel='Health options'),
+          probe_timeout: float = Option(2, help='Seconds to wait for a probe connection and its first byte.',
+                                        rich_help_panel='Health options'),
+          stall_deadline: float = Option(15, help='Seconds of failed probes or a retransmitting ssh connection '
+                                                  'to restart a stalled tunnel. 0 disables.',
+                                         rich_help_panel='Health options'),
+          on_demand: bool = Option(False, help='Listen to the local units and start the ssh of a tunnel '
+                                               'on its first connection.',
+                                   rich_help_panel='On-demand options'),
+          idle_timeout: float = Option(300, help='Seconds without connections to stop an on-demand ssh. 0 never.',
+                                       rich_help_panel='On-demand options'),
+          meter: bool = Option(False, help='Relay the connections through tunnel-runner and show the throughput, '
+                                           'bytes and connections per tunnel.',
+                               rich_help_panel='Metering options'),
+          metrics_file: Path = Option(None, show_default=False, help='A JSON file to write the traffic metrics '
+                                                                     'to on exit. Turns `--meter` on.',
+                                      rich_help_panel='Metering options'),
+          relay_engine: RelayEngine = Option(DEFAULT_RELAY_ENGINE.value,
+                                             help='How `--on-demand` and `--meter` move the bytes: `splice` in the '
+                                                  'kernel or `copy` through a userspace buffer.',
+                                             rich_help_panel='Metering options'),
+          multiplex: bool = Option(False, help='Share a ssh ControlMaster per ssh_host, so the next tunnels '
+                                               'to it skip the connection and authentication.',
+                                   rich_help_panel='Multiplexing options'),
+          control_persist: str = Option('10m', help='How long the master outlives its last tunnel. '
+                                                    'See `ControlPersist` of `man ssh_config`.',
+                                        rich_help_panel='Multiplexing options'),
+          config: Path = Option(CONFIG_FILE, help='The `tunnel-runner.toml` config.', rich_help_panel='Config options'),
+          ):
+    """Establish several SSH forward tunnels in one process and one event loop.
+    A status row per ssh process, the log pane of the selected one.
+    """
+
+    settings = Dynaconf(settings_file=config)  # TODO Validation
+
+    pairs = list(tunnels or [])
+    if group:
+        pairs.extend(settings.groups[group].tunnels)
+    if not pairs:
+        raise BadParameter('No tunnels, give `ssh_host:target` pairs or a group', param_hint='tunnels')
+
+    infos = []
+    for pair in pairs:
+        ssh_host, _, target = pair.rpartition(':')
+        if not ssh_host:
+            raise BadParameter(f'Not a `ssh_host:target` pair: {pair}', param_hint='tunnels')
+
+        info = resolve_tunnel(settings, ssh_host, target)
+        first = next((known for known in infos if known.remote_name == ssh_host), None)
+        if group_forwards and first:
+            first.forwards.append(info)
+        else:
+            infos.append(info)
+
+    import_urwid()
+    asyncio_loop = asyncio.new_event_loop()
+    panes, supervisors = [], []
+    for info in infos:
+        panes.append(TunnelPane(info=info,
+                                output=OutputQueue(max_lines=output_queue, overflow=overflow),
+                                list_walker=ScrollbackWalker(max_lines=scrollback_lines, max_bytes=scrollback_bytes)))
+
+    loop, refresh_status = create_multi_tui_loop(panes, fps, urwid.AsyncioEventLoop(loop=asyncio_loop))
+
+    def update_status(pane, status):
+        pane.status = status
+        refresh_status()
+
+    meter = meter or bool(metrics_file)
+    companions, relays, meters = [], [], []
+
+    masters, forwarded = {}, []
+    try:
+        for index, pane in enumerate(panes):
+            ssh_info = private_units(pane.info, index) if on_demand or meter else pane.info
+            cmd_args = build_cmd_args(ssh_info, verbose)
+            start = 'cold'
+            if multiplex:
+                ssh_host = pane.info.remote_name
+                if ssh_host not in masters:
+                    masters[ssh_host] = ControlMaster(ssh_host, control_persist)
+                    start = 'warm' if masters[ssh_host].is_alive() else 'cold'
+                else:
+                    start = 'warm'  # Tunnels of the same ssh_host go through the master started by the first one
+                cmd_args.extend(masters[ssh_host].options())
+                forwarded.append((masters[ssh_host], ssh_info))
+
+            status_line = StatusLine(lambda status, pane=pane: update_status(pane, status), loop)
+            supervisor = Supervisor(cmd_args, ssh_info, pane.output, asyncio_loop,
+                                    on_status=status_line.updater('ssh'),
+                                    tag_line=ForwardAttribution(ssh_info) if ssh_info.forwards else None,
+                                    start=start, restart=reconnect)
+            watchdog = Watchdog(supervisor, asyncio_loop, stall_deadline)
+            probe = HealthProbe(ssh_info, asyncio_loop, probe_interval, probe_timeout,
+                                on_status=status_line.updater('probe'), on_result=watchdog.observe_probe)
+            pane_companions = (probe,) * bool(probe_interval) + (watchdog,) * bool(stall_deadline and reconnect)
+            supervisors.append(supervisor)
+            companions.extend(pane_companions)
+            traffic = TrafficMeter(asyncio_loop, on_status=status_line.updater('traffic')) if meter else None
+            meters.append(traffic)
+            if on_demand or meter:
+                members = [PoolMember(ssh_info, supervisor, pane_companions, status_line.updater('ssh'))]
+                relays.append(RelayTunnel(pane.info, members, pane.output, asyncio_loop, on_demand, idle_timeout,
+                                          traffic, relay_engine))
+                relays[-1].start()
+            else:
+                supervisor.start()
+                for companion in pane_companions:
+                    companion.start()
+
+        loop.run()
+    finally:  # Ssh runs in a session of its own, it would outlive an exception of the TUI
+        for companion in companions:
+            companion.stop()
+        for relay in relays:
+            relay.stop()
+        for supervisor in supervisors:
+            supervisor.stop()
+        for master, ssh_info in forwarded:  # The private units of a relay
+            master.cancel(ssh_info)
+        asyncio_loop.close()
+
+    if metrics_file:
+        metrics_file.write_text(json.dumps([metrics_report(pane.info, traffic)
+                                            for pane, traffic in zip(panes, meters)], indent=2))
+
+
+@forward_cli.command('add')
+def forward_add(ssh_host: str = Argument(..., show_default=False, autocompletion=Autocompletion('ssh_hosts').do,
+                                         help="A ssh_host name of a live `--multiplex` master"),
+                target: str = Argument(..., show_default=False, autocompletion=Autocompletion('targets').do,
+                                       help="A target name from the util's config"),
+                config: Path = Option(CONFIG_FILE, help='The `tunnel-runner.toml` config.'),
+                ):
+    """Add a forward of a target on a live ssh ControlMaster. One control message, no new connection."""
+    control_forward_cli('forward', ssh_host, target, config)
+
+
+@forward_cli.command('cancel')
+def forward_cancel(ssh_host: str = Argument(..., show_default=False, autocompletion=Autocompletion('ssh_hosts').do,
+                                            help="A ssh_host name of a live `--multiplex` master"),
+                   target: str = Argument(..., show_default=False, autocompletion=Autocompletion('targets').do,
+                                          help="A target name from the util's config"),
+                   config: Path = Option(CONFIG_FILE, help='The `tunnel-runner.toml` config.'),
+                   ):
+    """Cancel a forward of a target on a live ssh ControlMaster."""
+    control_forward_cli('cancel', ssh_host, target, config)
+
+
+def control_forward_cli(operation: str, ssh_host: str, target: str, config: Path):
+    master = ControlMaster(ssh_host)
+    if not master.is_alive():
+        raise BadParameter(f'No live master of {ssh_host}, run a tunnel with `--multiplex` first',
+                           param_hint='ssh_host')
+
+    unit = resolve_tunnel(Dynaconf(settings_file=config), ssh_host, target)
+    error = master.control_forward(operation, unit)
+    if error:
+        print(error)
+        raise Exit(1)
+    done = 'Forwarded' if operation == 'forward' else 'Cancelled'
+    print(f'{done} {unit.local_unit} => {unit.remote_unit} [{target}]')
+
+
+@completion_cli.command('generate')
+def completion_generate(shell: List[str] = Option(list(COMPLETION_SCRIPTS), show_default=False,
+                                                  help='Shells to generate for. All the supported by default.'),
+                        output: Path = Option(None, show_default=False,
+                                              help='A file to write instead of the shell default location. '
+                                                   'Only with a single `--shell`.'),
+                        config: Path = Option(CONFIG_FILE, help='The `tunnel-runner.toml` config.'),
+                        ):
+    """Write bash, zsh, fish completion scripts with the ssh_host and target names embedded.
+
+    Default locations: bash-completion `completions` dir, `~/.zfunc` (add it to `fpath`),
+    fish `completions` dir. A script regenerates itself when the config becomes newer.
+    """
+
+    unsupported = set(shell) - set(COMPLETION_SCRIPTS)
+    if unsupported:
+        raise BadParameter(f'Unsupported shells: {", ".join(sorted(unsupported))}', param_hint='--shell')
+    if output and len(shell) != 1:
+        raise BadParameter('Requires a single `--shell`', param_hint='--output')
+
+    config = config.expanduser().resolve()
+    sections = load_config_sections(config)
+    func_name = '_' + re.sub(r'\W', '_', PROG_NAME) + '_completion'
+    groups = {group.name: [command.name for command in group.typer_instance.registered_commands]
+              for group in cli.registered_groups}
+    other_commands = [name for name in CLI_COMMANDS if name != 'run']
+
+    for name in shell:
+        template, script = COMPLETION_SCRIPTS[name]
+        script = (output or script).expanduser().resolve()
+        regenerate = shlex.join([sys.executable, str(Path(sys.argv[0]).resolve()), 'completion', 'generate',
+                                 '--shell', name, '--config', str(config), '--output', str(script)])
+
+        if name == 'bash':
+            hosts, targets = ([shlex.quote(record) for record in sections[section]]
+                              for section in (SECTION_HOSTS, SECTION_TARGETS))
+            value_options = '|'.join(sorted(RUN_VALUE_OPTIONS))
+            commands = ' '.join(CLI_COMMANDS)
+            subcommands = '\n'.join(f'        1:{group}) COMPREPLY=($(compgen -W "{" ".join(names)}" -- "$cur")) ;;'
+                                    for group, names in groups.items())
+            other_commands = '|'.join(f'*:{command}' for command in other_commands)
+        elif name == 'zsh':
+            hosts, targets = ([shlex.quote(record.replace(':', r'\:') + ':' + help)
+                               for record, help in sections[section].items()]
+                              for section in (SECTION_HOSTS, SECTION_TARGETS))
+            value_options = '|'.join(sorted(RUN_VALUE_OPTIONS))
+            commands = ' '.join(shlex.quote(f'{command}:{help}') for command, help in CLI_COMMANDS.items())
+            subcommands = '\n'.join(f'        1:{group}) compadd {" ".join(names)} ;;'
+                                    for group, names in groups.items())
+            other_commands = '|'.join(f'*:{command}' for command in other_commands)
+        else:
+            def fish_quote(text):
+                return "'" + text.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+            hosts, targets = ([fish_quote(f'{record}\t' + re.sub(r'\s', ' ', help) if help else record)
+                               for record, help in sections[section].items()]
+                              for section in (SECTION_HOSTS, SECTION_TARGETS))
+            value_options = ' '.join(sorted(RUN_VALUE_OPTIONS))
+            commands = ' '.join(f'{command} {fish_quote(help)}' for command, help in CLI_COMMANDS.items())
+            subcommands = '\n'.join(f"        case 1:{group}\n            printf '%s\\n' {' '.join(names)}"
+                                    for group, names in groups.items())
+            other_commands = ' '.join(f"'*:{command}'" for command in other_commands)
+
+        config_mtime = int(config.stat().st_mtime) if config.is_file() else "''"
+        script.parent.mkdir(parents=True, exist_ok=True)
+        script.write_text(template % dict(prog_name=PROG_NAME, func_name=func_name,
+                                          config=shlex.quote(str(config)), config_mtime=config_mtime,
+                                          script=shlex.quote(str(script)), regenerate=regenerate,
+                                          hosts=' '.join(hosts), targets=' '.join(targets),
+                                          value_options=value_options, commands=commands,
+                                          subcommands=subcommands, other_commands=other_commands))
+        print(f'{name}: {script}')
+
+
+def write_completion_scripts(value: bool):
+    if value:
+        completion_generate(shell=list(COMPLETION_SCRIPTS), output=None, config=CONFIG_FILE)
+        raise Exit()
+
+
+@cli.callback()
+def main(generate_completion: bool = Option(False, '--generate-completion', is_eager=True,
+                                            callback=write_completion_scripts,
+                                            help='Write the completion scripts of all the shells for the default '
+                                                 'config and exit. See `completion generate` for more.'),
+         ):
+    """The smart TUI for establishing an ssh tunnel.
+
+    Without a command the arguments go to `run`: `run_tunnel.py HOST TARGET`.
+    """
+
+
+async def feed_recording(records, output: OutputQueue, speed: float = 1, batch: int = 1000) -> int:
+    """Put the recorded lines at their offsets divided by the speed, in batches as fast as it goes at 0."""
+
+    started = time.monotonic()
+    count = 0
+    for count, (offset, style, line) in enumerate(records, 1):
+        if speed:
+            delay = offset / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % batch == 0:
+            await asyncio.sleep(0)  # Let the TUI take the lines
+        output.put(style, line)
+    return count
+
+
+@cli.command()
+def replay(recording: Path = Argument(..., exists=True, dir_okay=False, help='A recording of `run --record`.'),
+           speed: float = Option(1, min=0, help='Times the recorded pace. 0 is as fast as it goes.'),
+           scrollback_lines: int = Option(10000, help='Log lines to keep in the TUI. 0 is unlimited.',
+                                          rich_help_panel='TUI options'),
+           scrollback_bytes: int = Option(0, help='Log bytes to keep in the TUI. 0 is unlimited.',
+                                          rich_help_panel='TUI options'),
+           fps: int = Option(30, min=1, help='Max TUI redraws per second while the log floods.',
+                             rich_help_panel='TUI options'),
+           output_queue: int = Option(10000, min=1, help='Lines waiting for the TUI at most.',
+                                      rich_help_panel='TUI options'),
+           overflow: Overflow = Option(Overflow.drop_oldest.value, help='What to drop when the TUI falls behind.',
+                                       rich_help_panel='TUI options'),
+           headless: bool = Option(False, help='Replay on a headless screen of `--cols` x `--rows`, quit at the end '
+                                               'and print the pipeline numbers.', rich_help_panel='Headless options'),
+           cols: int = Option(100, min=10, help='Columns of the headless screen.', rich_help_panel='Headless options'),
+           rows: int = Option(40, min=5, help='Rows of the headless screen.', rich_help_panel='Headless options'),
+           ):
+    """Feed a recording of `run --record` to the TUI at its pace, N times faster or as fast as it goes.
+    Reproduce an incident exactly or profile the rendering against real traffic.
+    """
+
+    info, records = read_recording(recording)
+    import_urwid()
+    scrollback = ScrollbackWalker(max_lines=scrollback_lines, max_bytes=scrollback_bytes)
+    output = OutputQueue(max_lines=output_queue, overflow=overflow)
+    status = urwid.Text(f'Replay of {recording.name} ' + (f'at {speed:g}x' if speed else 'as fast as it goes'))
+    finished = None  # The sentinel of the last line put, whatever the recorded lines say
+    replayed = 0
+    screen = None
+
+    def quit_when_shown():
+        if finished and not output.lines:  # The last line is drained to the scrollback and drawn
+            loop.set_alarm_in(0, lambda *args: exit_on_q('q'))
+
+    asyncio_loop = asyncio.new_event_loop()
+    if headless:
+        screen = HeadlessScreen(cols, rows, on_draw=quit_when_shown)
+    loop = create_tui_loop(info, output, scrollback, fps, urwid.AsyncioEventLoop(loop=asyncio_loop),
+                           status=status, screen=screen)
+
+    async def play():
+        nonlocal finished, replayed
+        replayed = await feed_recording(records, output, speed)
+        finished = time.monotonic()
+        output.put('out', f'Replayed {replayed} lines in {finished - started:.3f}s')
+
+    started = time.monotonic()
+    task = asyncio_loop.create_task(play())
+    try:
+        loop.run()
+    finally:
+        task.cancel()
+        asyncio_loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+        asyncio_loop.close()
+        records.close()
+
+    if headless:
+        elapsed = time.monotonic() - started
+        shown = replayed + 1 - output.dropped_total  # The recorded lines and the last one, not the drop summaries
+        print(json.dumps({'lines': shown, 'seconds': elapsed, 'lines_per_second': shown / elapsed,
+                          'lines_dropped': output.dropped_total, 'redraws': screen.draws,
+                          'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}, indent=2))
+
+
+def percentiles(values: list, scale: float = 1000) -> Optional[dict]:
+    """p50, p90, p99 and max of the values, milliseconds for seconds by default."""
+    if not values:
+        return None
+    values = sorted(values)
+    return {f'p{percent}': values[round(percent / 100 * (len(values) - 1))] * scale for percent in (50, 90, 99)} \
+           | {'max': values[-1] * scale}
+
+
+async def bench_connection(event_loop: asyncio.AbstractEventLoop, unit: str, requests: int, request_size: int,
+                           bulk: int, timeout: float) -> dict:
+    """Connect, ping-pong the requests, then send the bulk bytes and read until the EOF of the other side."""
+
+    result = {'connect': None, 'rtts': [], 'bulk_sent': 0, 'bulk_received': 0, 'bulk_started': None,
+              'bulk_finished': None, 'error': None}
+    started = time.perf_counter()
+    try:
+        sock = await asyncio.wait_for(connect_unit(event_loop, unit), timeout)
+    except (OSError, asyncio.TimeoutError) as error:
+        result['error'] = f'connect: {error!r}'
+        return result
+    result['connect'] = time.perf_counter() - started
+
+    try:
+        payload = b'x' * request_size
+        buffer = bytearray(1 << 20)
+        for _ in range(requests):
+            started = time.perf_counter()
+            await event_loop.sock_sendall(sock, payload)
+            received = 0
+            while received < request_size:
+                size = await asyncio.wait_for(event_loop.sock_recv_into(sock, buffer), timeout)
+                if not size:
+                    raise ConnectionError('EOF before the response, not an echo server?')
+                received += size
+            result['rtts'].append(time.perf_counter() - started)
+
+        if bulk:
+            async def send():
+                chunk = memoryview(bytearray(1 << 20))
+                while result['bulk_sent'] < bulk:
+                    size = min(len(chunk), bulk - result['bulk_sent'])
+                    await event_loop.sock_sendall(sock, chunk[:size])
+                    result['bulk_sent'] += size
+                sock.shutdown(socket.SHUT_WR)
+
+            async def receive():  # An echo server sends it all back, a sink server just closes
+                while size := await asyncio.wait_for(event_loop.sock_recv_into(sock, buffer), timeout):
+                    result['bulk_received'] += size
+
+            result['bulk_started'] = time.perf_counter()
+            await asyncio.gather(send(), receive())
+            result['bulk_finished'] = time.perf_counter()
+    except (OSError, asyncio.TimeoutError) as error:
+        result['error'] = f'{"bulk" if result["bulk_started"] else "request"}: {error!r}'
+    finally:
+        sock.close()
+    return result
+
+
+@cli.command()
+def bench(target: str = Argument(..., show_default=False, autocompletion=Autocompletion('targets').do,
+                                 help="A target name from the util's config. Its tunnel has to run."),
+          unit: str = Option(None, show_default=False,
+                             help='A local unit to use instead of the target one: `address:port` or a unix socket.'),
+          connections: int = Option(10, min=1, help='Concurrent connections.'),
+          requests: int = Option(100, min=0, help='Request/response round trips per connection. '
+                                                  'The remote end has to echo.'),
+          request_size: int = Option(64, min=1, help='Bytes of a request.'),
+          bulk: int = Option(16, min=0, help='MiB to send per connection after the requests. '
+                                             'The remote end may echo or discard them.'),
+          timeout: float = Option(10, help='Seconds to wait for a connection or a response.'),
+          output: Path = Option(None, show_default=False, help='A file to write the JSON report to.'),
+          config: Path = Option(CONFIG_FILE, help='The `tunnel-runner.toml` config.'),
+          ):
+    """Load a running tunnel through the local unit of a target and report in JSON:
+    the connect latency and request/response RTT percentiles in milliseconds and the bulk throughput.
+
+    Any TCP echo server on the remote end does, e.g. `socat TCP-LISTEN:5432,fork,reuseaddr PIPE`.
+    """
+
+    if not unit:
+        unit = resolve_tunnel(Dynaconf(settings_file=config), '', target).local_unit
+
+    async def load():
+        return await asyncio.gather(*(bench_connection(event_loop, unit, requests, request_size, bulk << 20, timeout)
+                                      for _ in range(connections)))
+
+    event_loop = asyncio.new_event_loop()
+    started = time.perf_counter()
+    results = event_loop.run_until_complete(load())
+    elapsed = time.perf_counter() - started
+    event_loop.close()
+
+    bulks = [result for result in results if result['bulk_finished']]
+    bulk_report = None
+    if bulks:
+        bulk_elapsed = max(result['bulk_finished'] for result in bulks) - min(result['bulk_started'] for result in bulks)
+        sent = sum(result['bulk_sent'] for result in bulks)
+        bulk_report = {'connections': len(bulks), 'bytes_sent': sent,
+                       'bytes_received': sum(result['bulk_received'] for result in bulks),
+                       'seconds': bulk_elapsed, 'mib_per_second': sent / bulk_elapsed / (1 << 20),
+                       'per_connection_mib_per_second': percentiles(
+                           [result['bulk_sent'] / (result['bulk_finished'] - result['bulk_started'])
+                            for result in bulks], scale=1 / (1 << 20))}
+    errors = [result['error'] for result in results if result['error']]
+
+    report = json.dumps({'target': target, 'unit': unit, 'connections': connections, 'requests': requests,
+                         'request_size': request_size, 'bulk_mib': bulk, 'seconds': elapsed,
+                         'connect_ms': percentiles([result['connect'] for result in results if result['connect']]),
+                         'rtt_ms': percentiles([rtt for result in results for rtt in result['rtts']]),
+                         'bulk': bulk_report,
+                         'errors': len(errors), 'error_samples': sorted(set(errors))[:10]}, indent=2)
+    if output:
+        output.write_text(report)
+    print(report)
+    if errors:
+        raise Exit(1)
+
+
+BENCH_SINK = '''
+import socket
+server = socket.create_server(('127.0.0.1', 0))
+print(server.getsockname()[1], flush=True)
+buffer = bytearray(1 << 20)
+while True:
+    connection, _ = server.accept()
+    total = 0
+    while size := connection.recv_into(buffer):
+        total += size
+    connection.sendall(str(total).encode())
+    connection.close()
+'''
+
+BENCH_CLIENT = '''
+import socket, sys, time
+port, size = int(sys.argv[1]), int(sys.argv[2])
+chunk = memoryview(bytearray(1 << 20))
+started = time.perf_counter()
+connection = socket.create_connection(('127.0.0.1', port))
+sent = 0
+while sent < size:
+    connection.sendall(chunk[:min(len(chunk), size - sent)])
+    sent += min(len(chunk), size - sent)
+connection.shutdown(socket.SHUT_WR)
+received = int(connection.recv(64))
+print(time.perf_counter() - started, received)
+'''
+
+
+async def bench_relay_mode(event_loop: asyncio.AbstractEventLoop, upstream_port: int, size: int,
+                           engine: Optional[RelayEngine]) -> tuple:
+    """Send through a relay of the engine to the upstream port, or directly with no engine.
+
+    Return the seconds and the CPU seconds of this process, i.e. of the relay: the sink and the client
+    are processes of their own.
+    """
+
+    listener, accept = None, None
+    port = upstream_port
+    if engine:
+        listener = listen_unit('127.0.0.1:0')
+        port = listener.getsockname()[1]
+
+        async def serve():
+            client, _ = await event_loop.sock_accept(listener)
+            upstream = await connect_unit(event_loop, f'127.0.0.1:{upstream_port}')
+            try:
+                await relay_sockets(event_loop, client, upstream, engine)
+            finally:
+                client.close()
+                upstream.close()
+
+        accept = event_loop.create_task(serve())
+
+    cpu_started = time.process_time()
+    client = await asyncio.create_subprocess_exec(sys.executable, '-c', BENCH_CLIENT, str(port), str(size),
+                                                  stdout=subprocess.PIPE)
+    stdout, _ = await client.communicate()
+    cpu = time.process_time() - cpu_started
+    if accept:
+        await accept
+        listener.close()
+
+    elapsed, received = stdout.split()
+    if int(received) != size:
+        raise RuntimeError(f'The sink received {received} bytes of {size}')
+    return float(elapsed), cpu
+
+
+@benchmark_cli.command('relay')
+def benchmark_relay(size: int = Option(1024, min=1, help='MiB to send per run.'),
+                    rounds: int = Option(3, min=1, help='Runs per mode, the fastest one is reported.'),
+                    engines: List[RelayEngine] = Option([engine.value for engine in RelayEngine],
+                                                        help='Relay engines to compare.'),
+                    ssh_host: str = Option(None, show_default=False,
+                                           help='Send through a real `ssh -L` forward to this host, '
+                                                'e.g. localhost, instead of straight to the sink.'),
+                    json_output: bool = Option(False, '--json', help='Print a JSON report instead of a table.'),
+                    ):
+    """Compare the relay engines of `--on-demand` and `--meter` with no relay in front of the forward.
+
+    A client process sends to a sink process through each relay engine in turn. The CPU time is
+    of the relay only. `splice` needs Linux.
+    """
+
+    if RelayEngine.splice in engines and not hasattr(os, 'splice'):
+        raise BadParameter('`os.splice` is Linux only', param_hint='--engines')
+
+    sink = subprocess.Popen([sys.executable, '-c', BENCH_SINK], stdout=subprocess.PIPE, text=True)
+    ssh = None
+    try:
+        upstream_port = sink_port = int(sink.stdout.readline())
+        if ssh_host:
+            with socket.socket() as free:
+                free.bind(('127.0.0.1', 0))
+                upstream_port = free.getsockname()[1]
+            ssh = subprocess.Popen(['ssh', '-NL', f'127.0.0.1:{upstream_port}:127.0.0.1:{sink_port}',
+                                    '-o', 'ExitOnForwardFailure=yes', ssh_host], stdin=subprocess.DEVNULL)
+            started = time.monotonic()
+            while not unit_is_listening(f'127.0.0.1:{upstream_port}', 0):
+                if ssh.poll() is not None or time.monotonic() - started > 30:
+                    raise BadParameter(f'No ssh forward to {ssh_host}', param_hint='--ssh-host')
+                time.sleep(0.05)
+
+        event_loop = asyncio.new_event_loop()
+        report = []
+        for engine in [None, *engines]:
+            runs = [event_loop.run_until_complete(bench_relay_mode(event_loop, upstream_port, size << 20, engine))
+                    for _ in range(rounds)]
+            elapsed, cpu = min(runs)
+            report.append({'mode': engine.value if engine else 'direct', 'mib_per_second': size / elapsed,
+                           'relay_cpu_seconds_per_gib': cpu / size * 1024 if engine else 0.0,
+                           'seconds': elapsed})
+        event_loop.close()
+    finally:
+        for process in (ssh, sink):
+            if process:
+                process.terminate()
+                process.wait()
+
+    if json_output:
+        print(json.dumps({'size_mib': size, 'rounds': rounds, 'through': f'ssh {ssh_host}' if ssh_host else 'sink',
+                          'results': report}, indent=2))
+        return
+    print(f'{size} MiB through {"a ssh forward to " + ssh_host if ssh_host else "a local sink"}, '
+          f'the best of {rounds}')
+    print(f'{"mode":8} {"MiB/s":>10} {"relay CPU s/GiB":>16}')
+    for result in report:
+        print(f'{result["mode"]:8} {result["mib_per_second"]:10.1f} {result["relay_cpu_seconds_per_gib"]:16.3f}')
+
+
+FAKE_SSH = '''#!%(python)s
+import sys, time
+lines, rate, length, debug3_share = %(lines)d, %(rate)d, %(length)d, %(debug3_share)r
+err = sys.stderr
+started, sent = time.monotonic(), 0
+while sent < lines:
+    batch = lines - sent if not rate else min(lines - sent, max(1, int((time.monotonic() - started) * rate) - sent))
+    for seq in range(sent, sent + batch):
+        level = 3 if seq %% 100 < debug3_share * 100 else 1
+        line = f'debug{level}: t={time.monotonic():.6f} seq={seq} '
+        err.write(line.ljust(length, 'x') + '\\n')
+    err.flush()
+    sent += batch
+    if rate:
+        time.sleep(0.01)
+err.write('debug1: bench done\\n')
+err.flush()
+time.sleep(3600)
+'''
+
+
+@benchmark_cli.command('pipeline')
+def benchmark_pipeline(lines: int = Option(200000, min=1, help='Lines the fake ssh writes.'),
+                       rate: int = Option(0, min=0, help='Lines per second the fake ssh writes. 0 is as fast as it can.'),
+                       line_length: int = Option(120, min=40, help='Characters of a line.'),
+                       debug3_share: float = Option(0.9, min=0, max=1, help='The share of the `debug3` lines, '
+                                                                             'the rest are `debug1`.'),
+                       cols: int = Option(100, min=10, help='Columns of the headless screen.'),
+                       rows: int = Option(40, min=5, help='Rows of the headless screen.'),
+                       fps: int = Option(30, min=1, help='Max TUI redraws per second.'),
+                       scrollback_lines: int = Option(10000, help='Log lines to keep in the TUI. 0 is unlimited.'),
+                       output_queue: int = Option(10000, min=1, help='Ssh output lines waiting for the TUI at most.'),
+                       overflow: Overflow = Option(Overflow.drop_oldest.value,
+                                                   help='What to drop when the TUI falls behind.'),
+                       timeout: float = Option(300, help='Seconds to give up after.'),
+                       json_output: bool = Option(False, '--json', help='Print a JSON report instead of lines.'),
+                       ):
+    """Run the log pipeline of `run` offline: a scripted fake ssh on PATH, the supervisor, the pty reader,
+    the output queue and the `create_tui_loop` TUI on a headless screen.
+
+    Reports the lines per second ingested, the redraws, the peak RSS and the UI latency:
+    from a line written by the fake ssh until a redraw with it as the newest one.
+    """
+
+    import_urwid()
+    with tempfile.TemporaryDirectory(prefix='tunnel-runner-bench-') as fake_bin:
+        fake_ssh = Path(fake_bin) / 'ssh'
+        fake_ssh.write_text(FAKE_SSH % dict(python=sys.executable, lines=lines, rate=rate, length=line_length,
+                                            debug3_share=debug3_share))
+        fake_ssh.chmod(0o755)
+        env = dict(os.environ, PATH=fake_bin + os.pathsep + os.environ['PATH'])
+
+        info = TUIHeaderInfo(local_unit='127.0.0.1:0', local_name='bench',
+                             remote_unit='127.0.0.1:0', remote_name='fake-ssh')
+        scrollback = ScrollbackWalker(max_lines=scrollback_lines)
+        output = OutputQueue(max_lines=output_queue, overflow=overflow)
+        stamp = re.compile(r't=(\d+\.\d+)')
+        latencies = []
+        finished = None
+
+        def measure():
+            nonlocal finished
+            if finished or not len(scrollback):
+                return
+            newest = scrollback[scrollback.last_position].text
+            written = stamp.search(newest)
+            if written:
+                latencies.append(time.monotonic() - float(written.group(1)))
+            elif newest.startswith('debug1: bench done'):
+                finished = time.monotonic()
+                loop.set_alarm_in(0, lambda *args: exit_on_q('q'))
+
+        asyncio_loop = asyncio.new_event_loop()
+        screen = HeadlessScreen(cols, rows, on_draw=measure)
+        loop = create_tui_loop(info, output, scrollback, fps, urwid.AsyncioEventLoop(loop=asyncio_loop),
+                               screen=screen)
+        supervisor = Supervisor([], info, output, asyncio_loop, restart=False, env=env,
+                                watch_ready=False)  # The fake unit never listens
+        loop.set_alarm_in(timeout, lambda *args: exit_on_q('q'))
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.monotonic()
+        supervisor.start()
+        loop.run()
+        supervisor.stop()
+        asyncio_loop.close()
+
+    if not finished:
+        raise BadParameter(f'The fake ssh output did not show up in {timeout}s', param_hint='--timeout')
+    elapsed = finished - started
+    ingested = lines - output.dropped_total  # The fake ssh lines shown, not the drop summaries nor the done line
+    report = {'lines': lines, 'rate': rate, 'seconds': elapsed,
+              'lines_ingested': ingested, 'lines_dropped': output.dropped_total,
+              'lines_per_second': ingested / elapsed,
+              'redraws': screen.draws, 'redraws_per_second': screen.draws / elapsed,
+              'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+              'peak_rss_growth_mib': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+              'ui_latency_ms': percentiles(latencies)}
+
+    if json_output:
+        print(json.dumps(report, indent=2))
+        return
+    for name, value in report.items():
+        if isinstance(value, dict):
+            value = ' '.join(f'{key} {number:.1f}' for key, number in value.items())
+        elif isinstance(value, float):
+            value = f'{value:.1f}'
+        print(f'{name:20} {value}')
+
+
+@benchmark_cli.command('render')
+def benchmark_render(scrollback: List[int] = Option([10000, 100000, 1000000],
+                                                    help='Scrollback sizes in lines, one round each.'),
+                     cols: int = Option(160, min=20, help='Columns of the headless screen.'),
+                     rows: int = Option(50, min=10, help='Rows of the headless screen.'),
+                     frames: int = Option(100, min=1, help='Frames of the line flood.'),
+                     lines_per_frame: int = Option(1000, min=1, help='Lines added before a frame of the flood.'),
+                     resizes: int = Option(50, min=1, help='Resize events, each followed by a frame.'),
+                     line_length: int = Option(120, min=10, help='Characters of a line.'),
+                     json_output: bool = Option(False, '--json', help='Print a JSON report instead of lines.'),
+                     ):
+    """Drive the `create_tui_loop` TUI on a headless screen filled up to each scrollback size:
+    the render time of a frame in a line flood, the time to lay the screen out again after a resize
+    and the memory a retained line takes.
+    """
+
+    import_urwid()
+    info = TUIHeaderInfo(local_unit='127.0.0.1:0', local_name='bench',
+                         remote_unit='127.0.0.1:0', remote_name='headless')
+    sizes = [(cols, rows), (cols // 2, rows), (cols // 2, rows // 2), (cols, rows // 2)]
+    line = 'debug3: ' + 'x' * (line_length - 8)
+    report = []
+    for size in scrollback:
+        walker = ScrollbackWalker(max_lines=size)
+        tracemalloc.start()
+        started = time.perf_counter()
+        for number in range(size):
+            walker.add('out', f'{number:>10} {line}')
+        fill = time.perf_counter() - started
+        per_line = tracemalloc.get_traced_memory()[0] / size
+        tracemalloc.stop()
+        walker.set_focus(walker.last_position)
+
+        screen = HeadlessScreen(cols, rows)
+        loop = create_tui_loop(info, OutputQueue(), walker, screen=screen)
+        loop.start()
+        try:
+            loop.draw_screen()
+
+            frame_times = []
+            for _ in range(frames):
+                for number in range(lines_per_frame):
+                    walker.add('err' if number % 10 else 'out', f'{number:>10} {line}')
+                walker.set_focus(walker.last_position)
+                started = time.perf_counter()
+                loop.draw_screen()
+                frame_times.append(time.perf_counter() - started)
+
+            resize_times = []
+            for number in range(resizes):
+                started = time.perf_counter()
+                screen.resize(*sizes[(number + 1) % len(sizes)])  # The event a terminal or a tmux pane sends
+                loop.draw_screen()
+                resize_times.append(time.perf_counter() - started)
+        finally:
+            loop.stop()
+
+        report.append({'scrollback_lines': size, 'fill_seconds': fill, 'bytes_per_line': per_line,
+                       'frame_ms': percentiles(frame_times), 'resize_ms': percentiles(resize_times)})
+
+    if json_output:
+        print(json.dumps({'cols': cols, 'rows': rows, 'lines_per_frame': lines_per_frame, 'line_length': line_length,
+                          'results': report}, indent=2))
+        return
+    print(f'{cols}x{rows} screen, {frames} frames of {lines_per_frame} lines, {resizes} resizes')
+    print(f'{"lines":>9} {"bytes/line":>10} {"frame p50 ms":>12} {"frame p99 ms":>12} '
+          f'{"resize p50 ms":>13} {"resize p99 ms":>13}')
+    for result in report:
+        print(f'{result["scrollback_lines"]:>9} {result["bytes_per_line"]:>10.1f} '
+              f'{result["frame_ms"]["p50"]:>12.2f} {result["frame_ms"]["p99"]:>12.2f} '
+              f'{result["resize_ms"]["p50"]:>13.2f} {result["resize_ms"]["p99"]:>13.2f}')
+
+
+IMPORT_TIME = re.compile(r'import time:\s+(\d+) \|\s+\d+ \| +([\w.]+)$', re.MULTILINE)
+IMPORT_CONFIG = '[ssh_hosts.localhost]\n\n[targets.bench]\nlocal_port = 15432\nremote_port = 5432\n'
+IMPORT_BUDGETS = [  # A startup path, its arguments, a bash completion line or None, the modules it mustn't import
+    ('help', ['--help'], None, {'urwid', 'sh'}),
+    ('run help', ['run', '--help'], None, {'urwid', 'sh'}),
+    ('run completion', [], 'run --config {config} ', {'urwid', 'sh', 'rich', 'typer', 'dynaconf', 'asyncio',
+                                                      'tunnel_runner'}),
+    ('command completion', [], '', {'urwid', 'sh', 'rich', 'typer', 'dynaconf', 'asyncio', 'tunnel_runner'}),
+    ('option completion', [], 'run --', {'urwid', 'sh', 'rich'}),
+    ('completion generate', ['completion', 'generate', '--shell', 'bash', '--config', '{config}',
+                             '--output', '{tmp}/completion.bash'], None, {'urwid', 'sh'}),
+    ('benchmark relay', ['benchmark', 'relay', '--size', '1', '--rounds', '1', '--engines', 'copy'], None,
+     {'urwid', 'sh'}),
+]
+FAST_PATHS = {'run completion', 'command completion'}  # Answered by `complete_fast()`, their wall time is budgeted
+
+
+def run_startup_path(args: list, completion: Optional[str], tmp: str, *python_options) -> tuple:
+    """Run a startup path of this script in a fresh interpreter. The completed process and its wall ms."""
+
+    script = Path(__file__).resolve().with_name('run_tunnel.py')  # Not `sys.argv[0]`, it's pytest in the tests
+    env = dict(os.environ, XDG_CACHE_HOME=tmp, XDG_CONFIG_HOME=tmp)
+    if completion is not None:
+        words = f'{script.name} {completion}'
+        cword = len(words.split()) - (not words.endswith(' '))  # The word under the cursor
+        complete_var = f'_{script.name}_COMPLETE'.replace('-', '_').upper()  # `COMPLETE_VAR` of the script
+        env.update({complete_var: 'complete_bash', 'COMP_WORDS': words, 'COMP_CWORD': str(cword)})
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, *python_options, str(script), *args],
+                             env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return process, (time.perf_counter() - started) * 1000
+
+
+def measure_imports(args: list, completion: Optional[str], tmp: str) -> tuple:
+    """The import ms, the top level packages and the exit code of a startup path."""
+
+    process, _ = run_startup_path(args, completion, tmp, '-X', 'importtime')
+    imports = IMPORT_TIME.findall(process.stderr)
+    return (sum(int(micros) for micros, _ in imports) / 1000, {name.partition('.')[0] for _, name in imports},
+            process.returncode)
+
+
+def measure_python_startup() -> float:
+    """The wall ms of a bare interpreter, the floor of any startup path."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+@benchmark_cli.command('imports')
+def benchmark_imports(rounds: int = Option(3, min=1, help='Runs per path, the fastest one is reported.'),
+                      max_ms: float = Option(None, show_default=False,
+                                             help='Import milliseconds a path may take at most.'),
+                      max_fast_path_ms: float = Option(50, help='Wall milliseconds the completion fast path '
+                                                                 'may take over a bare interpreter startup.'),
+                      json_output: bool = Option(False, '--json', help='Print a JSON report instead of a table.'),
+                      ):
+    """Check the import budget of the startup paths: `--help` loads neither urwid nor sh,
+    a completion neither urwid nor rich, a headless command no urwid.
+
+    Each path runs in a fresh interpreter with `-X importtime`. Exits with 1 if a path
+    imports a module it mustn't, takes longer than `--max-ms` or fails, or if the completion
+    fast path takes longer than `--max-fast-path-ms` of wall time over a bare interpreter:
+    a TAB press should take tens of milliseconds. A script isn't cached in a .pyc, so the
+    compilation of `run_tunnel.py` counts there and it has to stay a small entry.
+    """
+
+    report = []
+    python_ms = min(measure_python_startup() for _ in range(rounds))
+    with tempfile.TemporaryDirectory(prefix='tunnel-runner-imports-') as tmp:
+        config = Path(tmp) / 'tunnel-runner.toml'
+        config.write_text(IMPORT_CONFIG)
+        for path, args, completion, forbidden in IMPORT_BUDGETS:
+            args = [arg.format(config=config, tmp=tmp) for arg in args]
+            completion = completion.format(config=config) if completion is not None else None
+            runs = [measure_imports(args, completion, tmp) for _ in range(rounds)]
+            milliseconds, packages, code = min(runs, key=lambda run: run[0])
+            wall = min(run_startup_path(args, completion, tmp)[1] for _ in range(rounds))  # No importtime overhead
+            violations = sorted(forbidden & packages)
+            slow = path in FAST_PATHS and wall - python_ms > max_fast_path_ms
+            report.append({'path': path, 'import_ms': round(milliseconds, 1), 'wall_ms': round(wall, 1),
+                           'packages': len(packages), 'forbidden_imported': violations, 'exit_code': code,
+                           'ok': not violations and not code and not slow
+                                 and (max_ms is None or milliseconds <= max_ms)})
+
+    if json_output:
+        print(json.dumps({'rounds': rounds, 'max_ms': max_ms, 'max_fast_path_ms': max_fast_path_ms,
+                          'python_startup_ms': round(python_ms, 1), 'results': report}, indent=2))
+    else:
+        print(f'python startup {python_ms:.1f} ms')
+        print(f'{"path":20} {"import ms":>9} {"wall ms":>8} {"packages":>8}  forbidden imported')
+        for result in report:
+            failure = '' if result['ok'] else ' FAIL' + (f' (exit {result["exit_code"]})' if result['exit_code'] else '')
+            print(f'{result["path"]:20} {result["import_ms"]:9.1f} {result["wall_ms"]:8.1f} {result["packages"]:8}  '
+                  f'{", ".join(result["forbidden_imported"]) or "-":20}{failure}')
+    if not all(result['ok'] for result in report):
+        raise Exit(1)
+
+
+def main():
+    """The entry of `run_tunnel.py` once its completion fast path passed."""
+
+    STARTUP_TIMINGS.mark('module definitions')
+    if os.getenv(COMPLETE_VAR):
+        cli()  # A completion renders no panels, so rich isn't imported
+        return
+
+    from unittest.mock import patch
+    from rich.panel import Panel as _Panel
+    from rich.box import SIMPLE
+    STARTUP_TIMINGS.mark('import rich')
+
+    class Panel(_Panel):
+        """Replacer of the hardcoded Panel Box type for removing a border."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, box=SIMPLE, **kwargs)
+
+    with patch('typer.rich_utils.Panel', Panel):
+        cli()